@@ -0,0 +1,245 @@
+"""Offline benchmarks of the Kusto MCP server and client.
+
+The server runs in process with its KustoClient replaced by FakeKustoClient,
+and the client talks to it over an in-memory MCP session with Azure OpenAI
+replaced by a scripted stub, so no Azure access is needed. Reports tool call
+latency per scenario, throughput under concurrent calls, process RSS and
+end-to-end process_query latency.
+
+Usage:
+    python benchmarks/bench.py [--calls 50] [--kusto-latency-ms 50] [--json results.json] [--baseline old.json]
+
+With --baseline, p50 latencies, throughput and RSS that got worse than the
+baseline by more than --tolerance are listed and the exit code is 1.
+"""
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import asyncio
+import importlib.util
+import io
+import json
+import logging
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fakes import FakeKustoClient, ScriptedCompletions, ScriptedOpenAI
+
+ROOT = Path(__file__).resolve().parent.parent
+REGION = "eastus2"
+SERVER_NAME = "bench-server"
+# Windows end before this time so that results are treated as closed; each call shifts its window back
+BASE_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+REQUEST_IDS = [f"{i:08x}-0000-4000-8000-000000000000" for i in range(0, 40, 4)]
+
+
+def load_module(name: str, path: Path) -> Any:
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def window(index: int, hours: float) -> Dict[str, str]:
+    end = BASE_TIME - timedelta(days=index)
+    return {"start_time": (end - timedelta(hours=hours)).isoformat(), "end_time": end.isoformat()}
+
+
+def server_arguments(index: int, hours: float, **extra: Any) -> Dict[str, Any]:
+    return {"region_name": REGION, "server_name": SERVER_NAME, **window(index, hours), **extra}
+
+
+# Scenario name, tool and the arguments of its index-th call
+SCENARIOS: List[Tuple[str, str, Callable[[int], Dict[str, Any]]]] = [
+    ("engine_logs", "get_engine_logs", lambda i: server_arguments(i, 1)),
+    ("engine_logs_cached", "get_engine_logs", lambda i: server_arguments(0, 1)),
+    ("engine_logs_sharded", "get_engine_logs", lambda i: server_arguments(i, 24)),
+    ("engine_logs_search", "get_engine_logs", lambda i: server_arguments(i, 1, search_key="error|timeout")),
+    ("engine_logs_compact", "get_engine_logs", lambda i: server_arguments(i, 1, compact=True)),
+    ("sidecar_logs_json", "get_sidecar_logs", lambda i: server_arguments(i, 1, output_format="json")),
+    ("sidecar_logs_summary", "get_sidecar_logs_summary", lambda i: server_arguments(i, 24)),
+    ("rp_events_with_errors", "get_rp_events", lambda i: server_arguments(i, 24, include_errors=True)),
+    ("rp_events_from_request_ids", "get_rp_events_from_request_ids", lambda i: {"region_name": REGION, "request_ids": REQUEST_IDS, **window(i, 24)}),
+    ("server_timeline", "get_server_timeline", lambda i: server_arguments(i, 1)),
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def call_tool(session: Any, tool: str, arguments: Dict[str, Any]) -> Tuple[float, int]:
+    started = time.perf_counter()
+    result = await session.call_tool(tool, arguments)
+    elapsed = time.perf_counter() - started
+    if result.isError:
+        raise RuntimeError(f"{tool} failed: {result.content}")
+    return elapsed, sum(len(item.text) for item in result.content if hasattr(item, "text"))
+
+
+async def bench_tools(session: Any, calls: int, results: Dict[str, float]):
+    print(f"Tool latency over {calls} sequential calls:")
+    offset = 1
+    for name, tool, arguments in SCENARIOS:
+        latencies, sizes = [], []
+        for i in range(calls):
+            elapsed, size = await call_tool(session, tool, arguments(offset + i))
+            latencies.append(elapsed)
+            sizes.append(size)
+        offset += calls
+        results[f"tool.{name}.p50_ms"] = percentile(latencies, 0.5) * 1000
+        results[f"tool.{name}.p99_ms"] = percentile(latencies, 0.99) * 1000
+        print(f"  {name:28} p50 {results[f'tool.{name}.p50_ms']:8.1f} ms  p99 {results[f'tool.{name}.p99_ms']:8.1f} ms  avg {sum(sizes) // len(sizes):8} chars")
+
+
+async def bench_throughput(session: Any, calls: int, levels: List[int], results: Dict[str, float]):
+    print(f"Throughput of {calls} get_engine_logs calls:")
+    offset = 100000
+    for level in levels:
+        semaphore = asyncio.Semaphore(level)
+        latencies = []
+
+        async def one(i: int):
+            async with semaphore:
+                elapsed, _ = await call_tool(session, "get_engine_logs", server_arguments(i, 1))
+                latencies.append(elapsed)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(offset + i) for i in range(calls)))
+        wall = time.perf_counter() - started
+        offset += calls
+        results[f"throughput.c{level}.calls_per_s"] = calls / wall
+        results[f"throughput.c{level}.p99_ms"] = percentile(latencies, 0.99) * 1000
+        print(f"  concurrency {level:3}: {calls / wall:8.1f} calls/s  p99 {results[f'throughput.c{level}.p99_ms']:8.1f} ms")
+
+
+async def bench_process_query(session: Any, client_module: Any, turns: int, llm_latency: float, results: Dict[str, float]):
+    turn = [200000]
+
+    def tool_calls() -> List[Dict[str, Any]]:
+        turn[0] += 1
+        return [
+            {"name": "get_engine_logs", "arguments": server_arguments(turn[0], 1)},
+            {"name": "get_sidecar_logs_summary", "arguments": server_arguments(turn[0], 24)},
+            {"name": "get_rp_events", "arguments": server_arguments(turn[0], 24, include_errors=True)},
+        ]
+
+    client = client_module.MCPClient()
+    client.session = session
+    client.openai = ScriptedOpenAI(ScriptedCompletions(tool_calls, first_token_latency=llm_latency))
+
+    # The client prints the answers as they stream in
+    with redirect_stdout(io.StringIO()):
+        for i in range(turns):
+            await client.process_query(f"What happened to {SERVER_NAME}? ({i})")
+
+    print(f"End-to-end process_query over {turns} turns with {llm_latency * 1000:.0f} ms to first token:")
+    for name in ("total", "openai", "tool_wait"):
+        values = [getattr(timing, name) for timing in client.turn_timings]
+        results[f"process_query.{name}.p50_ms"] = percentile(values, 0.5) * 1000
+        results[f"process_query.{name}.p99_ms"] = percentile(values, 0.99) * 1000
+        print(f"  {name:10} p50 {results[f'process_query.{name}.p50_ms']:8.1f} ms  p99 {results[f'process_query.{name}.p99_ms']:8.1f} ms")
+
+
+# Metrics that are better when higher; all others are better when lower
+HIGHER_IS_BETTER = (".calls_per_s",)
+
+
+def regressions(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    found = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        # The p99 of a run of a few dozen calls is too noisy to gate on
+        if not old or name.endswith(".p99_ms"):
+            continue
+        if name.endswith(HIGHER_IS_BETTER):
+            worse = value < old * (1 - tolerance)
+        else:
+            worse = value > old * (1 + tolerance)
+        if worse:
+            found.append(f"{name}: {old:.1f} -> {value:.1f}")
+    return found
+
+
+async def run(args: argparse.Namespace) -> Dict[str, float]:
+    # Results must come from the fake cluster, not from a cache left by a real run
+    os.environ.pop("KUSTO_RESULT_CACHE_DIR", None)
+    os.environ.pop("KUSTO_METRICS_DUMP_PATH", None)
+    for name in ("AZUREOPENAI_API_KEY", "AZUREOPENAI_ENDPOINT", "AZUREOPENAI_API_VERSION"):
+        os.environ.setdefault(name, "https://bench.invalid" if name == "AZUREOPENAI_ENDPOINT" else "bench")
+
+    FakeKustoClient.latency = args.kusto_latency_ms / 1000
+    FakeKustoClient.rows_per_minute = args.rows_per_minute
+    server = load_module("kusto_mcp_server", ROOT / "kusto-mcp-server" / "main.py")
+    server.KustoClient = FakeKustoClient
+    client_module = load_module("kusto_mcp_client", ROOT / "kusto-mcp-client" / "main.py")
+    # Per-request INFO logs of the MCP server would drown the report
+    logging.disable(logging.INFO)
+
+    from mcp.shared.memory import create_connected_server_and_client_session
+
+    results: Dict[str, float] = {}
+    rss_before = rss_mb()
+    async with create_connected_server_and_client_session(server.mcp._mcp_server) as session:
+        await bench_tools(session, args.calls, results)
+        await bench_throughput(session, args.calls, args.concurrency, results)
+        await bench_process_query(session, client_module, args.turns, args.llm_latency_ms / 1000, results)
+        if args.server_stats:
+            print(server.server_metrics.render_text())
+
+    results["rss.current_mb"] = rss_mb()
+    results["rss.peak_mb"] = peak_rss_mb()
+    print(f"RSS: {rss_before:.1f} MB after import, {results['rss.current_mb']:.1f} MB at the end, {results['rss.peak_mb']:.1f} MB peak")
+    print(f"Fake Kusto queries served: {FakeKustoClient.queries}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=50, help="Calls per tool scenario and per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels of the throughput run")
+    parser.add_argument("--turns", type=int, default=10, help="process_query turns of the end-to-end run")
+    parser.add_argument("--kusto-latency-ms", type=float, default=50, help="Latency of each fake Kusto query")
+    parser.add_argument("--rows-per-minute", type=float, default=10, help="Rows per minute in every fake table")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Time to first token of the scripted completions")
+    parser.add_argument("--server-stats", action="store_true", help="Also print the server's own stats")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change of a metric that counts as a regression")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        if found:
+            print(f"Regressions beyond {args.tolerance:.0%}:")
+            for line in found:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""Local stand-ins for the Kusto cluster and Azure OpenAI used by the benchmarks."""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import json
+import random
+import re
+
+# Message templates of the synthetic log rows, so that compaction and reduce have something to group
+MESSAGE_TEMPLATES = {
+    "MonMySQLLogs": [
+        "[Note] InnoDB: Buffer pool(s) load completed at {ts}",
+        "[Warning] Aborted connection {n} to db: 'app' user: 'u{n}' host: '10.0.{a}.{b}' (Got timeout reading communication packets)",
+        "[Note] Slave SQL thread for channel '' initialized, starting replication in log 'mysql-bin.{n:06}' at position {n}",
+        "[ERROR] Error writing file '/tmp/MY{n:x}' (Errcode: 28 - No space left on device)",
+    ],
+    "MonMySQLLauncher": [
+        "Launching mysqld with pid {n}",
+        "Health probe succeeded in {n} ms",
+        "Config file /app/work/my.cnf updated, {n} settings changed",
+    ],
+    "MonMySQLSideCar": [
+        "Backup of {n} bytes uploaded to blob in {a} ms",
+        "Replication lag is {a} seconds for replica 10.0.{a}.{b}",
+        "Actor heartbeat acknowledged after {n} ms",
+        "Failed to reach the primary 10.0.{a}.{b}:3306, retry {a}",
+    ],
+    "MonMySQLDirector": [
+        "Reconciling server bench-server generation {n}",
+        "Pod mysql-{a} of bench-server is ready",
+        "Requeue after {a}s: waiting for volume pvc-{n:x}",
+    ],
+    "MonOrcasBreadthRp": [
+        "Operation step {a} of {b} completed",
+        "Calling storage provider for request {n}",
+    ],
+}
+
+SOURCE_CONTEXTS = ["BackupActor", "ReplicationActor", "HealthActor", "ServerReconciler", "StorageReconciler"]
+EVENTS = ["OperationStarted", "OperationProgress", "OperationCompleted", "OperationFailed"]
+OPERATION_TYPES = ["CreateServer", "UpdateServer", "RestartServer", "ScaleStorage"]
+
+_PROJECT = re.compile(r"\|\s*project\s+([^\n|]+)")
+_SEARCH = re.compile(r"message (has|hasprefix|contains) (search_key_\d+)")
+_SEARCH_ANY = re.compile(r"message has_any \(([^)]*)\)")
+_ACTOR = re.compile(r"SourceContext contains (\w+)")
+
+
+def _time(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(str(value).strip())
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _kusto_string(value: datetime) -> str:
+    # tostring(datetime) in Kusto has a fixed width with 7 fractional digits
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f") + "0Z"
+
+
+def _column_type(values: List[Any]) -> str:
+    value = next((value for value in values if value is not None), "")
+    if isinstance(value, datetime):
+        return "datetime"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "long"
+    if isinstance(value, float):
+        return "real"
+    if isinstance(value, (dict, list)):
+        return "dynamic"
+    return "string"
+
+
+class FakeTable(list):
+    """Rows of one result table, with the column and kind attributes the Kusto client exposes."""
+
+    def __init__(self, rows: List[Dict[str, Any]], table_kind: str = "PrimaryResult"):
+        names = list(rows[0]) if rows else []
+        super().__init__([row[name] for name in names] for row in rows)
+        self.columns = [SimpleNamespace(column_name=name, column_type=_column_type([row[name] for row in rows])) for name in names]
+        self.table_kind = SimpleNamespace(value=table_kind)
+
+
+def _search_patterns(query: str, parameters: Dict[str, Any]) -> List[re.Pattern]:
+    """The search_key predicates of query as case-insensitive patterns, any of which a message has to match."""
+    terms = [(operator, parameters[name]) for operator, name in _SEARCH.findall(query)]
+    for names in _SEARCH_ANY.findall(query):
+        terms.extend(("has", parameters[name.strip()]) for name in names.split(","))
+    patterns = {
+        "has": lambda term: rf"\b{re.escape(term)}\b",
+        "hasprefix": lambda term: rf"\b{re.escape(term)}",
+        "contains": re.escape,
+    }
+    return [re.compile(patterns[operator](term), re.IGNORECASE) for operator, term in terms]
+
+
+class FakeKustoClient:
+    """Drop-in for azure.kusto.data.aio.KustoClient that serves synthetic rows.
+
+    Every table holds rows_per_minute rows per minute, on a grid aligned to
+    the epoch so that overlapping windows and time shards see the same rows.
+    A query is answered after latency seconds (scaled by a random factor
+    between 1 - jitter and 1 + jitter) with the rows of its window that match
+    its search_key and actor predicates, after its cursor and up to its
+    page_limit, projected to the columns of the last project clause. Every
+    server has the same rows, so server and request id predicates are not
+    applied. Summary queries get a histogram and a templates table.
+    """
+
+    rows_per_minute = 10.0
+    latency = 0.05
+    jitter = 0.2
+    queries = 0
+
+    def __init__(self, kcsb: Any = None):
+        self.random = random.Random(0)
+
+    async def close(self):
+        pass
+
+    async def execute_query(self, database: str, query: str, crp: Any) -> Any:
+        type(self).queries += 1
+        await asyncio.sleep(self.latency * self.random.uniform(1 - self.jitter, 1 + self.jitter))
+        parameters = dict(crp._parameters)
+        table = next((name for name in MESSAGE_TEMPLATES if name in query), "MonMySQLLogs")
+
+        if "reduce by" in query:
+            tables = self._summary(table, parameters)
+        elif "take 1" in query:
+            tables = [FakeTable([{"LogicalServerName": parameters.get("target_server_name")}])]
+        else:
+            tables = [FakeTable(self._page(table, query, parameters))]
+
+        consumption = {
+            "ExecutionTime": self.latency / 2,
+            "resource_usage": {"cpu": {"total cpu": "00:00:00.0156250"}, "memory": {"peak_per_node": 16 * 1024 * 1024}},
+            "input_dataset_statistics": {"extents": {"total": 100, "scanned": 4}, "rows": {"total": 10 ** 7, "scanned": 40000}},
+        }
+        completion = FakeTable(
+            [{"EventTypeName": "QueryResourceConsumption", "Payload": json.dumps(consumption)}],
+            table_kind="QueryCompletionInformation",
+        )
+        return SimpleNamespace(primary_results=tables, tables=tables + [completion])
+
+    def _rows(self, table: str, start: datetime, end: datetime):
+        step = timedelta(minutes=1) / self.rows_per_minute
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        index = -((epoch - start) // step)
+        while True:
+            timestamp = epoch + index * step
+            if timestamp > end:
+                return
+            yield index, timestamp
+            index += 1
+
+    def _value(self, table: str, column: str, index: int, timestamp: datetime) -> Any:
+        a, b, n = index % 7, index % 251, index * 7919 % 100000
+        if column == "TIMESTAMP":
+            return timestamp
+        if column == "message":
+            templates = MESSAGE_TEMPLATES[table]
+            return templates[index % len(templates)].format(ts=timestamp.isoformat(), n=n, a=a, b=b)
+        if column == "SourceContext":
+            return SOURCE_CONTEXTS[index % len(SOURCE_CONTEXTS)]
+        if column == "error_message":
+            return f"Operation failed with code {n}" if index % 11 == 0 else ""
+        if column == "error_messages":
+            return [f"Operation failed with code {n}"] if index % 11 == 0 else None
+        if column == "event":
+            return EVENTS[index % len(EVENTS)]
+        if column == "operation_type":
+            return OPERATION_TYPES[index % len(OPERATION_TYPES)]
+        if column == "request_id":
+            return f"{index // 4:08x}-0000-4000-8000-000000000000"
+        if column == "messages":
+            return [[timestamp.isoformat(), self._value(table, "message", index + i, timestamp), ""] for i in range(3)]
+        if column == "Source":
+            return ["engine", "launcher", "sidecar", "director"][index % 4]
+        return f"{column}-{index}"
+
+    def _page(self, table: str, query: str, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        start, end = _time(parameters.get("start_time")), _time(parameters.get("end_time"))
+        if not start or not end:
+            return []
+        cursor_time = parameters.get("cursor_time") or ""
+        cursor_tiebreak = int(parameters.get("cursor_tiebreak") or 0)
+        limit = int(parameters.get("page_limit") or 500)
+        projections = _PROJECT.findall(query)
+        columns = [column.split("=")[0].strip(" )") for column in projections[-1].split(",")] if projections else ["TIMESTAMP", "message"]
+        searches = _search_patterns(query, parameters)
+        actor = _ACTOR.search(query)
+        actor_name = parameters[actor.group(1)].lower() if actor else ""
+
+        rows = []
+        for index, timestamp in self._rows(table, start, end):
+            cursor = _kusto_string(timestamp)
+            tiebreak = index * 2654435761 % 2 ** 31
+            if cursor_time and (cursor, tiebreak) <= (cursor_time, cursor_tiebreak):
+                continue
+            if searches:
+                message = self._value(table, "message", index, timestamp)
+                if not any(search.search(message) for search in searches):
+                    continue
+            if actor_name not in self._value(table, "SourceContext", index, timestamp).lower():
+                continue
+            row = {column: self._value(table, column, index, timestamp) for column in columns}
+            row["_tiebreak"] = tiebreak
+            row["_cursor_time"] = cursor
+            rows.append(row)
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def _summary(self, table: str, parameters: Dict[str, Any]) -> List[FakeTable]:
+        start, end = _time(parameters.get("start_time")), _time(parameters.get("end_time"))
+        histogram = []
+        if start and end:
+            bucket = max((end - start) / 48, timedelta(minutes=1))
+            timestamp = start
+            while timestamp < end:
+                for source in SOURCE_CONTEXTS[:3]:
+                    histogram.append({"TIMESTAMP": timestamp, "SourceContext": source, "Count": int(bucket.total_seconds() / 60 * self.rows_per_minute / 3)})
+                timestamp += bucket
+        templates = [
+            {"Count": 1000 // (i + 1), "Pattern": template.replace("{", "*").split("*")[0] + "*", "Representative": template}
+            for i, template in enumerate(MESSAGE_TEMPLATES[table])
+        ]
+        return [FakeTable(histogram), FakeTable(templates)]
+
+
+def _chunk(content: Optional[str] = None, tool_calls: Optional[List[Any]] = None) -> Any:
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=tool_calls))])
+
+
+def _tool_call_delta(index: int, call_id: Optional[str] = None, name: Optional[str] = None, arguments: Optional[str] = None) -> Any:
+    return SimpleNamespace(index=index, id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+class ScriptedCompletions:
+    """Stands in for chat.completions of AsyncAzureOpenAI with a fixed script.
+
+    When the last message is from the user, the completion streams the tool
+    calls returned by tool_calls(); otherwise it streams a short answer. The
+    first chunk arrives after first_token_latency seconds and each further
+    chunk after chunk_latency seconds.
+    """
+
+    def __init__(self, tool_calls: Callable[[], List[Dict[str, Any]]], first_token_latency: float = 0.3, chunk_latency: float = 0.01):
+        self.tool_calls = tool_calls
+        self.first_token_latency = first_token_latency
+        self.chunk_latency = chunk_latency
+        self.requests = 0
+
+    async def create(self, messages: List[dict], **kwargs: Any) -> Any:
+        self.requests += 1
+        if messages and messages[-1]["role"] == "user":
+            chunks = []
+            for index, call in enumerate(self.tool_calls()):
+                arguments = json.dumps(call["arguments"])
+                middle = len(arguments) // 2
+                chunks.append(_chunk(tool_calls=[_tool_call_delta(index, f"call_{self.requests}_{index}", call["name"], arguments[:middle])]))
+                chunks.append(_chunk(tool_calls=[_tool_call_delta(index, arguments=arguments[middle:])]))
+        else:
+            chunks = [_chunk(f"word{i} ") for i in range(40)]
+        return self._stream(chunks)
+
+    async def _stream(self, chunks: List[Any]):
+        await asyncio.sleep(self.first_token_latency)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(self.chunk_latency)
+            yield chunk
+
+
+class ScriptedOpenAI:
+    def __init__(self, completions: ScriptedCompletions):
+        self.chat = SimpleNamespace(completions=completions)
+
+    async def close(self):
+        pass
@@ -1,57 +1,414 @@
+import argparse
 import asyncio
 import os
 import json
+import sys
+import time
 
 from dotenv import load_dotenv
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, List, Tuple
+from collections import deque
 from contextlib import AsyncExitStack
+from dataclasses import asdict, dataclass, field
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
 
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
 
 load_dotenv() # take environment variables from .env.
 
+# Maximum time to wait for a single tool call on the MCP server
+TOOL_CALL_TIMEOUT_SECONDS = float(os.getenv("MCP_TOOL_CALL_TIMEOUT_SECONDS", "120"))
+# Maximum time to wait for the server to answer a ping before its session counts as lost
+PING_TIMEOUT_SECONDS = float(os.getenv("MCP_PING_TIMEOUT_SECONDS", "10"))
+# Token budget for the messages sent with each completion request
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "60000"))
+# Number of most recent turns that are always sent in full
+CONTEXT_PINNED_TURNS = int(os.getenv("CONTEXT_PINNED_TURNS", "2"))
+# Tool outputs of older turns are cut down to this many tokens before whole turns are evicted
+CONTEXT_COMPACTED_TOOL_OUTPUT_TOKENS = int(os.getenv("CONTEXT_COMPACTED_TOOL_OUTPUT_TOKENS", "200"))
+# Number of recent turns whose timings are kept for the "stats" command
+TURN_TIMING_HISTORY = int(os.getenv("MCP_TURN_TIMING_HISTORY", "1000"))
+# Sessions of a batch run answering queries at the same time
+BATCH_CONCURRENCY = int(os.getenv("MCP_BATCH_CONCURRENCY", "4"))
+# Azure OpenAI requests and tokens per minute a batch run may use across its sessions; 0 is unlimited
+AZUREOPENAI_REQUESTS_PER_MINUTE = int(os.getenv("AZUREOPENAI_REQUESTS_PER_MINUTE", "0"))
+AZUREOPENAI_TOKENS_PER_MINUTE = int(os.getenv("AZUREOPENAI_TOKENS_PER_MINUTE", "0"))
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    # tiktoken is not installed, or its encoding is not cached and cannot be downloaded
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, otherwise estimate ~4 characters per token"""
+    if not text:
+        return 0
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if _encoding:
+        return _encoding.decode(_encoding.encode(text)[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+class ConversationContext:
+    """Conversation messages kept within a token budget.
+
+    A turn starts at each user message and holds the assistant and tool
+    messages that follow it. System messages and the most recent
+    pinned_turns turns are always kept. When the conversation exceeds the
+    budget, tool outputs of older turns are compacted to their first few
+    lines first, and if that is not enough the oldest turns are evicted
+    whole, so that tool messages never lose the assistant message that
+    requested them.
+    """
+
+    # Per-message overhead of the chat format
+    MESSAGE_OVERHEAD_TOKENS = 4
+    COMPACTED_MARKER = "tokens of older tool output omitted ...]"
+
+    def __init__(
+        self,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        pinned_turns: int = CONTEXT_PINNED_TURNS,
+        compacted_tool_output_tokens: int = CONTEXT_COMPACTED_TOOL_OUTPUT_TOKENS,
+    ):
+        self.token_budget = token_budget
+        self.pinned_turns = pinned_turns
+        self.compacted_tool_output_tokens = compacted_tool_output_tokens
+        self.messages: List[dict] = []
+        self._tokens: List[int] = []
+
+    def _count(self, message: dict) -> int:
+        tokens = self.MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "")
+        for tool_call in message.get("tool_calls") or []:
+            tokens += count_tokens(tool_call["function"]["name"]) + count_tokens(tool_call["function"]["arguments"])
+        return tokens
+
+    def append(self, message: dict):
+        self.messages.append(message)
+        self._tokens.append(self._count(message))
+
+    def extend(self, messages: List[dict]):
+        for message in messages:
+            self.append(message)
+
+    def clear(self):
+        self.messages = []
+        self._tokens = []
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self._tokens)
+
+    def _turn_starts(self) -> List[int]:
+        return [i for i, message in enumerate(self.messages) if message["role"] == "user"]
+
+    def _compact_tool_output(self, index: int):
+        message = self.messages[index]
+        tokens = self._tokens[index]
+        if message["content"].endswith(self.COMPACTED_MARKER) or tokens <= self.compacted_tool_output_tokens + self.MESSAGE_OVERHEAD_TOKENS:
+            return
+        head = truncate_to_tokens(message["content"], self.compacted_tool_output_tokens)
+        omitted = tokens - self.compacted_tool_output_tokens
+        self.messages[index] = {**message, "content": f"{head}\n[... ~{omitted} {self.COMPACTED_MARKER}"}
+        self._tokens[index] = self._count(self.messages[index])
+
+    def _evict(self, start: int, end: int):
+        # System messages are pinned even inside an evicted turn
+        keep = [i for i in range(start, end) if self.messages[i]["role"] == "system"]
+        self.messages[start:end] = [self.messages[i] for i in keep]
+        self._tokens[start:end] = [self._tokens[i] for i in keep]
+
+    def window(self) -> List[dict]:
+        """Return the messages to send, compacting and evicting older turns to fit the budget"""
+        if self.total_tokens <= self.token_budget:
+            return self.messages
+
+        # The current turn is always pinned
+        pinned_turns = max(self.pinned_turns, 1)
+        turn_starts = self._turn_starts()
+        unpinned_end = turn_starts[-pinned_turns] if len(turn_starts) > pinned_turns else 0
+
+        for i in range(unpinned_end):
+            if self.messages[i]["role"] == "tool":
+                self._compact_tool_output(i)
+                if self.total_tokens <= self.token_budget:
+                    return self.messages
+
+        while self.total_tokens > self.token_budget:
+            turn_starts = self._turn_starts()
+            if len(turn_starts) <= pinned_turns:
+                break
+            self._evict(0, turn_starts[1])
+
+        return self.messages
+
+class RateLimiter:
+    """Azure OpenAI requests and tokens used over the last minute, shared by the sessions of a batch run.
+
+    acquire waits until one more request with the given estimated prompt
+    tokens fits both limits; once the usage is known, record adds the
+    completion tokens and corrects the estimate by the difference to the
+    reported prompt tokens, which may be negative. A limit of 0 is unlimited,
+    and a request larger than the token limit is let through alone.
+    """
+
+    WINDOW_SECONDS = 60.0
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        # (time, requests, tokens) of the last minute
+        self._usage: deque = deque()
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now: float):
+        while self._usage and now - self._usage[0][0] >= self.WINDOW_SECONDS:
+            self._usage.popleft()
+
+    async def acquire(self, tokens: int):
+        # Waiters queue on the lock, so they are let through in order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                requests = sum(entry[1] for entry in self._usage)
+                used_tokens = sum(entry[2] for entry in self._usage)
+                over_requests = self.requests_per_minute and requests >= self.requests_per_minute
+                over_tokens = self.tokens_per_minute and self._usage and used_tokens + tokens > self.tokens_per_minute
+                if not over_requests and not over_tokens:
+                    self._usage.append((now, 1, tokens))
+                    return
+                await asyncio.sleep(self._usage[0][0] + self.WINDOW_SECONDS - now)
+
+    def record(self, tokens: int):
+        self._usage.append((time.monotonic(), 0, tokens))
+
+
+@dataclass
+class TurnTiming:
+    """Where the time of one process_query call went, in seconds, and the tokens it used.
+
+    Tool calls start while the completion that requested them is still
+    streaming, so tool_wait only counts the time spent waiting for them after
+    it ended; tool_calls holds the full duration of each call. Token counts
+    are those Azure OpenAI reported for the turn's completions.
+    """
+    total: float = 0.0
+    openai: float = 0.0
+    first_token: float = 0.0
+    tool_wait: float = 0.0
+    tool_calls: List[Tuple[str, float]] = field(default_factory=list)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def describe(self) -> str:
+        calls = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.tool_calls)
+        return (
+            f"total {self.total:.2f}s, openai {self.openai:.2f}s (first token {self.first_token:.2f}s), "
+            f"tool wait {self.tool_wait:.2f}s, tokens {self.prompt_tokens} prompt + {self.completion_tokens} completion"
+            + (f", tool calls: {calls}" if calls else "")
+        )
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
 class MCPClient():
-    def __init__(self):
+    def __init__(self, echo: bool = True, rate_limiter: Optional[RateLimiter] = None):
+        """
+        Args:
+            echo: print answers as they stream in and the tools found on connecting
+            rate_limiter: limiter every Azure OpenAI request waits on
+        """
+        self.echo = echo
+        self.rate_limiter = rate_limiter
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
-        self.openai = AzureOpenAI(
+        self.openai = AsyncAzureOpenAI(
             api_version=os.getenv("AZUREOPENAI_API_VERSION"),
             api_key=os.getenv("AZUREOPENAI_API_KEY"),
             azure_endpoint=os.getenv("AZUREOPENAI_ENDPOINT")
         )
-        self.conversation_context: List[dict] = []
+        self.conversation_context = ConversationContext()
         self.active_tools: Dict[str, dict] = {}
+        self.turn_timings: deque = deque(maxlen=TURN_TIMING_HISTORY)
     
     def _manage_context(self) -> List[Dict]:
-        return self.conversation_context
+        return self.conversation_context.window()
     
-    async def connect_to_server(self, server_script_path: str):
+    async def connect_to_server(self, server: str):
         """Connect to an MCP server
 
         Args:
-            server_script_path: Path to the server script (.py or .js)
+            server: URL of a running server, ending in /sse for the SSE transport
+                and /mcp for streamable HTTP, or path to a server script (.py or .js)
+                to start over stdio
         """
-        server_params = StdioServerParameters(
-            command="python",
-            args=[server_script_path],
-            env=None
-        )
-
-        stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-        self.stdio, self.write = stdio_transport
+        if server.startswith(("http://", "https://")):
+            if server.rstrip("/").endswith("/sse"):
+                self.stdio, self.write = await self.exit_stack.enter_async_context(sse_client(server))
+            else:
+                self.stdio, self.write, _ = await self.exit_stack.enter_async_context(streamablehttp_client(server))
+        else:
+            server_params = StdioServerParameters(
+                command="python",
+                args=[server],
+                env=None
+            )
+            self.stdio, self.write = await self.exit_stack.enter_async_context(stdio_client(server_params))
         self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
 
         await self.session.initialize()
 
         # List available tools
         response = await self.session.list_tools()
-        print("\nConnected to server with tools:", [tool.name for tool in response.tools])
+        if self.echo:
+            print("\nConnected to server with tools:", [tool.name for tool in response.tools])
+
+    async def is_connected(self) -> bool:
+        """Whether the server still answers a ping on the session"""
+        if not self.session:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=PING_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            return False
+
+    async def _call_tool(self, tool_call: dict, timing: Optional[TurnTiming] = None) -> dict:
+        """Call a tool on the MCP server and wrap its output as a tool message.
+
+        Timeouts and errors are reported as the tool's content so that one
+        failing call does not discard the results of the others.
+        """
+        tool_name = tool_call["function"]["name"]
+        started = time.perf_counter()
+        try:
+            tool_args = json.loads(tool_call["function"]["arguments"] or "{}")
+            tool_result = await asyncio.wait_for(
+                self.session.call_tool(tool_name, tool_args),
+                timeout=TOOL_CALL_TIMEOUT_SECONDS
+            )
+            text_content = " ".join([item.text for item in tool_result.content if hasattr(item, 'text')])
+        except asyncio.TimeoutError:
+            text_content = f"Error: tool {tool_name} timed out after {TOOL_CALL_TIMEOUT_SECONDS} seconds"
+        except Exception as e:
+            text_content = f"Error calling tool {tool_name}: {str(e)}"
+        if timing:
+            timing.tool_calls.append((tool_name, time.perf_counter() - started))
+
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call["id"],
+            "content": text_content
+        }
+
+    async def _stream_completion(
+        self,
+        available_tools: List[dict],
+        on_tool_call: Optional[Callable[[dict], None]] = None,
+        timing: Optional[TurnTiming] = None,
+    ) -> dict:
+        """Stream a chat completion, printing content as it arrives when echo is set.
+
+        Tool call deltas are assembled by index. The model streams tool calls
+        one after another, so a call is complete once the next index shows up
+        or the stream ends; on_tool_call is invoked with each complete call so
+        that it can start before the rest of the completion has arrived.
+
+        Returns the assistant message as a dict suitable for the conversation context.
+        The time spent and the tokens used are added to timing.
+        """
+        started = time.perf_counter()
+        messages = self._manage_context()
+        estimated_tokens = 0
+        if self.rate_limiter:
+            # The tool schemas are sent with every request and are part of its prompt
+            estimated_tokens = self.conversation_context.total_tokens + count_tokens(json.dumps(available_tools))
+            await self.rate_limiter.acquire(estimated_tokens)
+        stream = await self.openai.chat.completions.create(
+            model=os.getenv("AZUREOPENAI_MODEL"),
+            messages=messages,
+            tools=available_tools,
+            tool_choice="auto",
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+        content = []
+        tool_calls: List[dict] = []
+        usage = None
+        async for chunk in stream:
+            if timing and not timing.first_token:
+                timing.first_token = time.perf_counter() - started
+            # The last chunk carries the usage of the whole completion
+            usage = getattr(chunk, "usage", None) or usage
+            # Azure sends content filter results and the usage in chunks without choices
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            if delta.content:
+                if self.echo:
+                    print(delta.content, end="", flush=True)
+                content.append(delta.content)
+
+            for tool_call_delta in delta.tool_calls or []:
+                if tool_call_delta.index >= len(tool_calls):
+                    if tool_calls and on_tool_call:
+                        on_tool_call(tool_calls[-1])
+                    tool_calls.append({"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+
+                tool_call = tool_calls[tool_call_delta.index]
+                if tool_call_delta.id:
+                    tool_call["id"] = tool_call_delta.id
+                if tool_call_delta.function:
+                    tool_call["function"]["name"] += tool_call_delta.function.name or ""
+                    tool_call["function"]["arguments"] += tool_call_delta.function.arguments or ""
+
+        if tool_calls and on_tool_call:
+            on_tool_call(tool_calls[-1])
+        if timing:
+            timing.openai += time.perf_counter() - started
+            if usage:
+                timing.prompt_tokens += usage.prompt_tokens
+                timing.completion_tokens += usage.completion_tokens
+        if self.rate_limiter and usage:
+            self.rate_limiter.record(usage.prompt_tokens - estimated_tokens + usage.completion_tokens)
+
+        message = {"role": "assistant", "content": "".join(content) or None}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return message
 
     async def process_query(self, query: str):
-        """Process a query using AzureOpenAI and available tools"""
+        """Process a query using AzureOpenAI and available tools.
+
+        The timings of the turn are appended to turn_timings.
+        """
+        timing = TurnTiming()
+        started = time.perf_counter()
+        try:
+            return await self._process_query(query, timing)
+        finally:
+            timing.total = time.perf_counter() - started
+            self.turn_timings.append(timing)
+
+    async def _process_query(self, query: str, timing: TurnTiming):
         # Add user message to context
         self.conversation_context.append({"role": "user", "content": query})
 
@@ -66,57 +423,49 @@ class MCPClient():
             }
         } for t in tools_response.tools]
 
-        # Initial OpenAI call
-        response = self.openai.chat.completions.create(
-            model=os.getenv("AZUREOPENAI_MODEL"),
-            messages=self._manage_context(),
-            tools=available_tools,
-            tool_choice="auto",
-            # response_format=
+        # Initial OpenAI call; tools start running as soon as their arguments have streamed in
+        tool_tasks = []
+        message = await self._stream_completion(
+            available_tools,
+            on_tool_call=lambda tool_call: tool_tasks.append(asyncio.create_task(self._call_tool(tool_call, timing))),
+            timing=timing,
         )
-        message = response.choices[0].message
         self.conversation_context.append(message)
 
-        if message.tool_calls:
-            tools_responses = []
-
-            # Call each tool requested by LLM and get its output
-            for tool_call in message.tool_calls:
-                tool_name = tool_call.function.name
-                tool_args = json.loads(tool_call.function.arguments)
-
-                # Call tool on MCP server
-                tool_result = await self.session.call_tool(tool_name, tool_args)
-                text_content = " ".join([item.text for item in tool_result.content if hasattr(item, 'text')])
-                tools_responses.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": text_content
-                })
-            
+        if tool_tasks:
+            # Tools run concurrently; gather keeps the tool_call order
+            waited = time.perf_counter()
+            tools_responses = await asyncio.gather(*tool_tasks)
+            timing.tool_wait = time.perf_counter() - waited
+
             self.conversation_context.extend(tools_responses)
 
             # Get follow-up response with tool results
-            response = self.openai.chat.completions.create(
-                model=os.getenv("AZUREOPENAI_MODEL"),
-                messages=self._manage_context(),
-                tools=available_tools,
-                tool_choice="auto",
-            )
+            response = await self._stream_completion(available_tools, timing=timing)
 
             self.conversation_context.append({
                 "role": "assistant",
-                "content": response.choices[0].message.content
+                "content": response["content"]
             })
-            return response.choices[0].message.content
+            return response["content"]
         else:
-            self.conversation_context.append(message.content)
-            return message.content
+            return message["content"]
+
+    def timing_summary(self) -> str:
+        """Percentiles of the recorded turn timings"""
+        if not self.turn_timings:
+            return "No turns recorded yet."
+        lines = [f"Last {len(self.turn_timings)} turns:"]
+        for name in ("total", "openai", "first_token", "tool_wait"):
+            values = [getattr(timing, name) for timing in self.turn_timings]
+            lines.append(f"{name}: p50 {percentile(values, 0.5):.2f}s, p99 {percentile(values, 0.99):.2f}s, sum {sum(values):.2f}s")
+        lines.append(f"Last turn: {self.turn_timings[-1].describe()}")
+        return "\n".join(lines)
 
     async def chat_loop(self):
         """Run an interactive chat loop"""
         print("\nMCP Client Started!")
-        print("Type your queries or 'quit' to exit.")
+        print("Type your queries, 'stats' for timings or 'quit' to exit.")
 
         while True:
             try:
@@ -125,12 +474,18 @@ class MCPClient():
                     break
 
                 if query.lower() == 'reset':
-                    self.conversation_context = []
+                    self.conversation_context.clear()
                     print("\nConversation context reset.")
                     continue
 
-                response = await self.process_query(query)
-                print("\n" + response)
+                if query.lower() == 'stats':
+                    print(f"\n{self.timing_summary()}")
+                    continue
+
+                print()
+                # The response is printed while it streams in
+                await self.process_query(query)
+                print()
 
             except Exception as e:
                 print(f"\nError: {str(e)}")
@@ -138,19 +493,138 @@ class MCPClient():
     async def cleanup(self):
         """Clean up resources"""
         await self.exit_stack.aclose()
+        await self.openai.close()
+
+def read_batch(path: str) -> List[dict]:
+    """Read batch queries from a JSONL file, or stdin for "-".
+
+    Each line is an object with a "query" and any other fields to copy to
+    its result, or just the query as a JSON string.
+    """
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        records = []
+        for line in stream:
+            if line.strip():
+                record = json.loads(line)
+                records.append(record if isinstance(record, dict) else {"query": record})
+        return records
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+async def run_batch(server: str, records: List[dict], output, concurrency: int, rate_limiter: RateLimiter):
+    """Answer records with a pool of concurrent sessions and write one JSONL result per record as it finishes.
+
+    Each session has its own connection to the server and its context is
+    cleared before every query, so queries never see each other's
+    conversation. Results carry the record's fields, its index in the input,
+    the answer or error, and the turn's timings and token counts.
+
+    A session that fails to connect, or whose server stops answering, ends
+    and leaves its records to the others. If no session is left, every
+    record not answered yet gets an error result, so each record always has
+    one result line.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for index, record in enumerate(records):
+        queue.put_nowait((index, record))
+    workers = min(concurrency, len(records))
+    # Records without a result yet; a session that ends early puts its record back, so idle sessions wait until this is 0
+    unanswered = len(records)
+    # Why the sessions that ended early did so
+    session_errors: List[str] = []
+
+    def write_result(result: dict):
+        nonlocal unanswered
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+        print(f"[{result['index'] + 1}/{len(records)}] {'error' if 'error' in result else 'done'}", file=sys.stderr)
+        unanswered -= 1
+        if unanswered == 0:
+            # Wake the sessions waiting for records so they can close
+            for _ in range(workers):
+                queue.put_nowait(None)
+
+    def end_session(error: str):
+        session_errors.append(error)
+        print(f"Session ended: {error}", file=sys.stderr)
+
+    async def worker():
+        # The session is entered and closed in the same task, as the MCP transports require
+        client = MCPClient(echo=False, rate_limiter=rate_limiter)
+        try:
+            try:
+                await client.connect_to_server(server)
+            except Exception as e:
+                end_session(f"Failed to connect to {server}: {e!r}")
+                return
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                index, record = item
+                client.conversation_context.clear()
+                result = {**record, "index": index}
+                if "query" not in record:
+                    result["error"] = 'Record has no "query"'
+                else:
+                    try:
+                        result["answer"] = await client.process_query(record["query"])
+                    except Exception as e:
+                        if not await client.is_connected():
+                            # Leave the record to a session that is still connected
+                            queue.put_nowait((index, record))
+                            end_session(f"Lost the connection to {server}: {e!r}")
+                            return
+                        result["error"] = str(e)
+                    result["stats"] = asdict(client.turn_timings[-1])
+                write_result(result)
+        finally:
+            try:
+                await client.cleanup()
+            except Exception as e:
+                print(f"Failed to close a session: {e!r}", file=sys.stderr)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+    while unanswered:
+        index, record = queue.get_nowait()
+        write_result({**record, "index": index, "error": f"No session to the server is left: {session_errors[-1]}"})
+
 
 async def main():
-    if len(sys.argv) < 2:
-        print("Usage: python main.py <url>")
-        sys.exit(1)
-    
+    parser = argparse.ArgumentParser(description="Chat with the Kusto MCP server, or answer a batch of queries")
+    parser.add_argument("server", help="URL of a running server or path to a server script")
+    parser.add_argument("--batch", metavar="FILE", help='JSONL file of queries to answer unattended, "-" for stdin')
+    parser.add_argument("--output", metavar="FILE", help="File the JSONL results of --batch are written to (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Sessions of --batch answering queries at the same time")
+    parser.add_argument("--requests-per-minute", type=int, default=AZUREOPENAI_REQUESTS_PER_MINUTE, help="Azure OpenAI requests per minute of --batch; 0 is unlimited")
+    parser.add_argument("--tokens-per-minute", type=int, default=AZUREOPENAI_TOKENS_PER_MINUTE, help="Azure OpenAI tokens per minute of --batch; 0 is unlimited")
+    args = parser.parse_args()
+
+    if args.batch:
+        output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            await run_batch(
+                args.server,
+                read_batch(args.batch),
+                output,
+                max(args.concurrency, 1),
+                RateLimiter(args.requests_per_minute, args.tokens_per_minute),
+            )
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        return
+
     client = MCPClient()
     try:
-        await client.connect_to_server(sys.argv[1])
+        await client.connect_to_server(args.server)
         await client.chat_loop()
     finally:
         await client.cleanup()
 
 if __name__ == "__main__":
-    import sys
     asyncio.run(main())
\ No newline at end of file
@@ -1,10 +1,35 @@
 from mcp.server import FastMCP
-from azure.kusto.data import KustoClient, KustoConnectionStringBuilder, ClientRequestProperties
+from azure.kusto.data import KustoConnectionStringBuilder, ClientRequestProperties
+from azure.kusto.data.aio import KustoClient
+from azure.kusto.data._cloud_settings import CloudSettings
+from azure.identity import AzureCliCredential
+from concurrent.futures import Future
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import asyncio
+import base64
+import bisect
+import csv
+import functools
+import hashlib
+import heapq
+import inspect
+import io
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import secrets
+import threading
+import time
 import uuid
 
-# Initialize the FastMCP server
-mcp = FastMCP()
-
 # Global region URIs map
 region_uris = {
     "eastus2": "https://sqlazureeus22.kustomfa.windows.net",
@@ -20,387 +45,1945 @@ region_uris = {
 
 DATABASE_NAME = "sqlazure1"
 
-@mcp.tool()
-def get_engine_logs(region_name: str, server_name: str, start_time: str, end_time: str, search_key: str = None) -> str:
-    """Get mysql server engine logs between start_time and end_time.
-    
-    Args:
-        region_name: Name of the region where server is deployed
-        server_name: Name of the server
-        start_time: Start time of the query
-        end_time: End time of the query
-        search_key: Optional search key to filter logs
+logger = logging.getLogger(__name__)
+
+# Pooled clients that have not been used for this long are closed and dropped
+CLIENT_IDLE_TIMEOUT_SECONDS = float(os.getenv("KUSTO_CLIENT_IDLE_TIMEOUT_SECONDS", "900"))
+# Queries beyond this many per cluster wait for a running one to finish
+MAX_INFLIGHT_QUERIES_PER_REGION = int(os.getenv("KUSTO_MAX_INFLIGHT_QUERIES_PER_REGION", "4"))
+# Cached tokens are refreshed in the background once they are this close to expiry
+TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv("KUSTO_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# Rows returned per page by the log tools, and the most a caller may ask for
+DEFAULT_PAGE_SIZE = int(os.getenv("KUSTO_DEFAULT_PAGE_SIZE", "500"))
+MAX_PAGE_SIZE = int(os.getenv("KUSTO_MAX_PAGE_SIZE", "5000"))
+# Windows longer than this are split into sub-windows queried concurrently (0 disables sharding)
+SHARD_SPAN_MINUTES = float(os.getenv("KUSTO_SHARD_SPAN_MINUTES", "360"))
+# Sub-windows of one tool call that may run at the same time
+SHARD_CONCURRENCY = int(os.getenv("KUSTO_SHARD_CONCURRENCY", "4"))
+# How far back the region probe of region_name="auto" looks for a server's logs
+LOCATE_LOOKBACK_HOURS = int(os.getenv("KUSTO_LOCATE_LOOKBACK_HOURS", "168"))
+# Caps on what the RP tools collect per request id
+MAX_ERRORS_PER_REQUEST = int(os.getenv("KUSTO_MAX_ERRORS_PER_REQUEST", "5"))
+MAX_MESSAGES_PER_REQUEST = int(os.getenv("KUSTO_MAX_MESSAGES_PER_REQUEST", "200"))
+# Target number of histogram buckets and message templates returned by the summary tools
+SUMMARY_BUCKETS = int(os.getenv("KUSTO_SUMMARY_BUCKETS", "48"))
+SUMMARY_TOP_GROUPS = int(os.getenv("KUSTO_SUMMARY_TOP_GROUPS", "10"))
+SUMMARY_TOP_TEMPLATES = int(os.getenv("KUSTO_SUMMARY_TOP_TEMPLATES", "10"))
+# Templates tracked by compact=True results before further templates are lumped together
+COMPACT_MAX_TEMPLATES = int(os.getenv("KUSTO_COMPACT_MAX_TEMPLATES", "200"))
+# Rendered rows of one response stop at this many bytes; the cursor resumes after the last row written
+RESPONSE_MAX_BYTES = int(os.getenv("KUSTO_RESPONSE_MAX_BYTES", "200000"))
+# In-memory query result cache limits
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("KUSTO_RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("KUSTO_RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Optional directory for an on-disk result cache tier that survives restarts
+RESULT_CACHE_DIR = os.getenv("KUSTO_RESULT_CACHE_DIR")
+RESULT_CACHE_DISK_MAX_BYTES = int(os.getenv("KUSTO_RESULT_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+# Windows ending less than this long ago may still receive rows and are only cached briefly
+RESULT_CACHE_OPEN_WINDOW_SECONDS = float(os.getenv("KUSTO_RESULT_CACHE_OPEN_WINDOW_SECONDS", "900"))
+RESULT_CACHE_OPEN_WINDOW_TTL_SECONDS = float(os.getenv("KUSTO_RESULT_CACHE_OPEN_WINDOW_TTL_SECONDS", "60"))
+RESULT_CACHE_CLOSED_WINDOW_TTL_SECONDS = float(os.getenv("KUSTO_RESULT_CACHE_CLOSED_WINDOW_TTL_SECONDS", "86400"))
+# Optional file the OpenMetrics text of the server stats is written to when a session ends
+METRICS_DUMP_PATH = os.getenv("KUSTO_METRICS_DUMP_PATH")
+# Recent rows kept per followed log stream, streams kept at most, and how far behind now a follow poll stops to let late rows arrive
+FOLLOW_BUFFER_ROWS = int(os.getenv("KUSTO_FOLLOW_BUFFER_ROWS", "1000"))
+FOLLOW_MAX_STREAMS = int(os.getenv("KUSTO_FOLLOW_MAX_STREAMS", "64"))
+FOLLOW_LAG_SECONDS = float(os.getenv("KUSTO_FOLLOW_LAG_SECONDS", "30"))
+# "stdio" serves one client per process; "streamable-http" and "sse" serve many clients from one long-running process
+TRANSPORTS = ("stdio", "streamable-http", "sse")
+TRANSPORT = os.getenv("KUSTO_MCP_TRANSPORT", "stdio")
+HTTP_HOST = os.getenv("KUSTO_MCP_HOST", "127.0.0.1")
+# The HTTP transports have no authentication, so binding anything but these is warned about
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+HTTP_PORT = int(os.getenv("KUSTO_MCP_PORT", "8000"))
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, as exposed in OpenMetrics.
+
+    counts[i] holds the observations that fall in bucket i alone; the last
+    entry counts those above the largest bound.
     """
-    cluster_uri = region_uris.get(region_name)
-    if not cluster_uri:
-        return f"Region {region_name} is not supported"
-    
-    kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_uri)
 
-    result = []
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
 
-    with KustoClient(kcsb) as client:
-        crp = ClientRequestProperties()
-        crp.client_request_id = "kusto-mcp-server" + str(uuid.uuid4())
-        crp.set_parameter("target_server_name", server_name)
-        crp.set_parameter("start_time", start_time)
-        crp.set_parameter("end_time", end_time)
-        crp.set_parameter("search_key", search_key)
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, or the largest observation when it is past the last bucket."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank and seen:
+                return bound
+        return self.max
+
+    def cumulative(self) -> Iterator[Tuple[str, int]]:
+        """(le, count) pairs of the cumulative OpenMetrics buckets."""
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield repr(bound), total
+        yield "+Inf", self.count
+
+
+@dataclass
+class _CachedToken:
+    token: str
+    expires_on: float
+
+
+def az_cli_token_source(audience: str) -> Tuple[str, float]:
+    """Fetch a token for audience from the Azure CLI, returning (token, expires_on)."""
+    access_token = AzureCliCredential().get_token(f"{audience}/.default")
+    return access_token.token, float(access_token.expires_on)
+
+
+@functools.lru_cache(maxsize=None)
+def kusto_audience(cluster_uri: str) -> str:
+    """Resource the tokens of cluster_uri are issued for, derived from the cluster's auth metadata the way the Kusto SDK does.
+
+    Clusters that require MFA accept the kustomfa variant of the Kusto
+    service resource, which all the regional clusters share, so one token
+    serves every region.
+    """
+    cloud_info = CloudSettings.get_cloud_info_for_cluster(cluster_uri)
+    resource = cloud_info.kusto_service_resource_id
+    if cloud_info.login_mfa_required:
+        resource = resource.replace(".kusto.", ".kustomfa.")
+    return resource
+
+
+class TokenCache:
+    """AAD tokens cached per cluster audience.
+
+    A valid cached token is returned without calling token_source. Once a
+    token is within refresh_margin seconds of expiry it is still served while
+    a background thread fetches its replacement, and concurrent fetches for
+    the same audience share a single call to token_source.
+    """
+
+    # Tokens closer than this to expiry are not served while a refresh runs
+    MIN_VALIDITY_SECONDS = 30
+
+    def __init__(
+        self,
+        token_source: Callable[[str], Tuple[str, float]] = az_cli_token_source,
+        refresh_margin: float = TOKEN_REFRESH_MARGIN_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.token_source = token_source
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.fetch_latency = Histogram()
+        self._tokens: Dict[str, _CachedToken] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_token(self, audience: str) -> str:
+        with self._lock:
+            cached = self._tokens.get(audience)
+            remaining = cached.expires_on - self.clock() if cached else 0
+            if remaining > self.MIN_VALIDITY_SECONDS:
+                self.hits += 1
+                if remaining <= self.refresh_margin and audience not in self._inflight:
+                    threading.Thread(target=self._refresh_in_background, args=(audience,), daemon=True).start()
+                return cached.token
+            self.misses += 1
+
+        return self._refresh(audience)
+
+    def _refresh(self, audience: str) -> str:
+        with self._lock:
+            future = self._inflight.get(audience)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[audience] = future
+
+        if not owner:
+            return future.result()
 
-        query = """
-        declare query_parameters(target_server_name:string, start_time: string, end_time: string, search_key: string);
-        let start = todatetime(start_time);
-        let end = todatetime(end_time);
-        MonMySQLLogs
-        | where LogicalServerName == target_server_name
-        | where TIMESTAMP between (start .. end)
-        | where message contains search_key
-        | project TIMESTAMP, message
-        | limit 500
-        """
-        
         try:
-            response = client.execute_query(DATABASE_NAME, query, crp)
-            for row in response.primary_results[0]:
-                result.append(f"Timestamp: {row['TIMESTAMP']}, Message: {row['message']}")
+            started = time.perf_counter()
+            token, expires_on = self.token_source(audience)
+            with self._lock:
+                self._tokens[audience] = _CachedToken(token, expires_on)
+                self.refreshes += 1
+                self.fetch_latency.observe(time.perf_counter() - started)
+            future.set_result(token)
         except Exception as e:
-            return f"Error executing query: {str(e)}"
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(audience, None)
 
-        return "\n---\n".join(result)
+        return future.result()
 
-@mcp.tool()
-def get_launcher_logs(region_name: str, server_name: str, start_time: str, end_time: str, search_key: str = None) -> str:
-    """Get messages for the launcher container of mysql server for the given time range.
-    
-    Args:
-        region_name: Name of the region where server is deployed
-        server_name: Name of the server
-        start_time: Start time of the query
-        end_time: End time of the query
-        search_key: Optional search key to filter logs
+    def _refresh_in_background(self, audience: str):
+        try:
+            self._refresh(audience)
+        except Exception:
+            # The cached token stays valid; the next call past expiry retries in the foreground
+            logger.warning("Background token refresh failed for %s", audience, exc_info=True)
+
+    def async_token_provider(self, cluster_uri: str) -> Callable[[], Awaitable[str]]:
+        """Callback for KustoConnectionStringBuilder.with_async_token_provider.
+
+        Tokens are cached by the cluster's kusto_audience, which is looked up
+        once per cluster. Cache hits return immediately; the lookup and a
+        fetch from token_source run on a worker thread so they never block
+        the event loop.
+        """
+        async def provide() -> str:
+            return await asyncio.to_thread(lambda: self.get_token(kusto_audience(cluster_uri)))
+        return provide
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "cached_audiences": len(self._tokens),
+            }
+
+
+kusto_tokens = TokenCache()
+
+
+@dataclass
+class _PooledClient:
+    client: KustoClient
+    last_used: float
+    inflight: asyncio.Semaphore
+    leases: int = 0
+
+
+class KustoClientPool:
+    """Long-lived async KustoClient per cluster, shared across tool calls.
+
+    Clients are created lazily on first use so the HTTP session and token are
+    reused by later calls. At most max_inflight queries run against one
+    cluster at a time; further leases wait their turn. A client that has been
+    idle for longer than idle_timeout and is not leased by any in-flight call
+    is closed on the next lease; close() shuts everything down when the
+    server exits.
     """
-    cluster_uri = region_uris.get(region_name)
-    if not cluster_uri:
-        return f"Region {region_name} is not supported"
-    
-    kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_uri)
 
-    result = []
+    def __init__(
+        self,
+        idle_timeout: float = CLIENT_IDLE_TIMEOUT_SECONDS,
+        max_inflight: int = MAX_INFLIGHT_QUERIES_PER_REGION,
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_inflight = max_inflight
+        self._clients: Dict[str, _PooledClient] = {}
+        self._lock = asyncio.Lock()
 
-    with KustoClient(kcsb) as client:
-        crp = ClientRequestProperties()
-        crp.client_request_id = "kusto-mcp-server" + str(uuid.uuid4())
-        crp.set_parameter("target_server_name", server_name)
-        crp.set_parameter("start_time", start_time)
-        crp.set_parameter("end_time", end_time)
+    def _create_client(self, cluster_uri: str) -> KustoClient:
+        kcsb = KustoConnectionStringBuilder.with_async_token_provider(
+            cluster_uri, kusto_tokens.async_token_provider(cluster_uri)
+        )
+        return KustoClient(kcsb)
+
+    async def _evict_idle(self, now: float):
+        expired = [
+            uri for uri, pooled in self._clients.items()
+            if pooled.leases == 0 and now - pooled.last_used > self.idle_timeout
+        ]
+        for uri in expired:
+            await self._clients.pop(uri).client.close()
+
+    @asynccontextmanager
+    async def lease(self, cluster_uri: str) -> AsyncIterator[KustoClient]:
+        """Borrow the shared client for cluster_uri for the duration of a query."""
+        async with self._lock:
+            now = time.monotonic()
+            await self._evict_idle(now)
+            pooled = self._clients.get(cluster_uri)
+            if pooled is None:
+                pooled = _PooledClient(self._create_client(cluster_uri), now, asyncio.Semaphore(self.max_inflight))
+                self._clients[cluster_uri] = pooled
+            pooled.leases += 1
 
-        query = """
-        declare query_parameters(target_server_name:string, start_time: string, end_time: string, search_key: string);
-        let start = todatetime(start_time);
-        let end = todatetime(end_time);
-        MonMySQLLauncher
-        | where LogicalServerName == target_server_name
-        | where TIMESTAMP between(start .. end)
-        | where message contains search_key
-        | project TIMESTAMP, message
-        | limit 500
-        """
-        
         try:
-            response = client.execute_query(DATABASE_NAME, query, crp)
-            for row in response.primary_results[0]:
-                result.append(f"Timestamp: {row['TIMESTAMP']}, Message: {row['message']}")
-        except Exception as e:
-            return f"Error executing query: {str(e)}"
+            async with pooled.inflight:
+                yield pooled.client
+        finally:
+            pooled.leases -= 1
+            pooled.last_used = time.monotonic()
 
-        return "\n---\n".join(result)
+    async def close(self):
+        """Close every pooled client."""
+        async with self._lock:
+            clients, self._clients = self._clients, {}
+        for pooled in clients.values():
+            await pooled.client.close()
 
-@mcp.tool()
-def get_sidecar_logs(region_name: str, server_name: str, start_time: str, end_time: str, search_key: str = None) -> str:
-    """Get messages for the sidecar container of mysql server for the given time range.
-    
-    Args:
-        region_name: Name of the region where server is deployed
-        server_name: Name of the server
-        start_time: Start time of the query
-        end_time: End time of the query
-        search_key: Optional search key to filter logs
+
+kusto_clients = KustoClientPool()
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO 8601 time the way Kusto's todatetime does, treating naive times as UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def normalize_time(value: Optional[str]) -> Optional[str]:
+    """Canonical UTC form of a time argument, or the argument itself if it cannot be parsed."""
+    parsed = parse_time(value)
+    return parsed.isoformat() if parsed else value
+
+
+def result_ttl(end_time: Optional[str]) -> float:
+    """Closed windows cannot change and are cached long; windows touching now are cached briefly."""
+    end = parse_time(end_time)
+    if end is None or (datetime.now(timezone.utc) - end).total_seconds() < RESULT_CACHE_OPEN_WINDOW_SECONDS:
+        return RESULT_CACHE_OPEN_WINDOW_TTL_SECONDS
+    return RESULT_CACHE_CLOSED_WINDOW_TTL_SECONDS
+
+
+@dataclass
+class _CachedResult:
+    text: str
+    expires_at: float
+
+
+class ResultCache:
+    """Query results cached in an in-memory LRU with an optional on-disk tier.
+
+    The memory tier is bounded by entry count and total text size. When a
+    cache_dir is configured, results with a TTL longer than the open-window
+    TTL are also written there as JSON files so they survive restarts. The
+    size of every file is indexed when the cache starts and kept current on
+    writes, and files are removed oldest-first only once their total grows
+    past disk_max_bytes. Expired entries are dropped from both tiers when a
+    lookup finds them.
     """
-    cluster_uri = region_uris.get(region_name)
-    if not cluster_uri:
-        return f"Region {region_name} is not supported"
-    
-    kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_uri)
 
-    result = []
+    def __init__(
+        self,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        cache_dir: Optional[str] = RESULT_CACHE_DIR,
+        disk_max_bytes: int = RESULT_CACHE_DISK_MAX_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _CachedResult]" = OrderedDict()
+        self._bytes = 0
+        # Size of every file in cache_dir, oldest first
+        self._disk_files: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._index_disk()
+
+    @staticmethod
+    def key(tool_name: str, region_name: str, query: str, parameters: Dict[str, Any], options: Optional[Dict[str, Any]] = None) -> str:
+        normalized = {
+            name: normalize_time(value) if name in ("start_time", "end_time") else value
+            for name, value in parameters.items()
+        }
+        raw = json.dumps([tool_name, region_name, query, normalized, options], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[_CachedResult]:
+        try:
+            with open(self._disk_path(key), encoding="utf-8") as f:
+                return _CachedResult(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _index_disk(self):
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-len(".json")], stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk_files[key] = size
+            self._disk_bytes += size
+
+    def _remove_disk(self, key: str):
+        with self._disk_lock:
+            self._disk_bytes -= self._disk_files.pop(key, 0)
+        try:
+            os.remove(self._disk_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _write_disk(self, key: str, entry: _CachedResult):
+        path = self._disk_path(key)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"text": entry.text, "expires_at": entry.expires_at}, f)
+        os.replace(f"{path}.tmp", path)
+        size = os.path.getsize(path)
+
+        with self._disk_lock:
+            self._disk_bytes += size - self._disk_files.pop(key, 0)
+            self._disk_files[key] = size
+            evicted = []
+            while self._disk_files and self._disk_bytes > self.disk_max_bytes:
+                oldest, oldest_size = self._disk_files.popitem(last=False)
+                self._disk_bytes -= oldest_size
+                evicted.append(oldest)
+        for oldest in evicted:
+            try:
+                os.remove(self._disk_path(oldest))
+            except FileNotFoundError:
+                pass
+
+    def _store(self, key: str, entry: _CachedResult):
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key).text)
+        # An entry the memory tier cannot hold would only evict everything else
+        if len(entry.text) > self.max_bytes or self.max_entries < 1:
+            return
+        self._entries[key] = entry
+        self._bytes += len(entry.text)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._bytes -= len(self._entries.popitem(last=False)[1].text)
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is None and self.cache_dir:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None and entry.expires_at > now:
+                self._store(key, entry)
+
+        if entry is not None and entry.expires_at <= now:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key).text)
+            if key in self._disk_files:
+                await asyncio.to_thread(self._remove_disk, key)
+            entry = None
 
-    with KustoClient(kcsb) as client:
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.text
+
+    async def put(self, key: str, text: str, ttl: float):
+        entry = _CachedResult(text, time.time() + ttl)
+        self._store(key, entry)
+        if self.cache_dir and ttl > RESULT_CACHE_OPEN_WINDOW_TTL_SECONDS:
+            try:
+                await asyncio.to_thread(self._write_disk, key, entry)
+            except OSError:
+                logger.warning("Failed to write result cache entry to %s", self.cache_dir, exc_info=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
+
+
+result_cache = ResultCache()
+
+
+@dataclass
+class _ToolStats:
+    latency: Histogram = field(default_factory=Histogram)
+    calls: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    rows: int = 0
+    bytes: int = 0
+    format_seconds: float = 0.0
+
+
+@dataclass
+class _RegionStats:
+    latency: Histogram = field(default_factory=Histogram)
+    lease_wait: Histogram = field(default_factory=Histogram)
+    queries: int = 0
+    errors: int = 0
+    execution_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_memory_bytes: int = 0
+    extents_scanned: int = 0
+    extents_total: int = 0
+    rows_scanned: int = 0
+    rows_total: int = 0
+
+
+def _timespan_seconds(value: str) -> float:
+    """Seconds in a Kusto timespan string such as "00:00:01.5" or "1.02:00:00"."""
+    hours, minutes, seconds = value.split(":")
+    days, _, hours = hours.rpartition(".")
+    return (int(days or 0) * 24 + int(hours)) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def query_resource_consumption(response: Any) -> Optional[Dict[str, Any]]:
+    """Payload of the QueryResourceConsumption event Kusto reports in the QueryCompletionInformation table, if any."""
+    for table in getattr(response, "tables", None) or []:
+        if getattr(table.table_kind, "value", table.table_kind) != "QueryCompletionInformation":
+            continue
+        for row in _table_rows(table):
+            if row.get("EventTypeName") == "QueryResourceConsumption":
+                payload = row.get("Payload")
+                return json.loads(payload) if isinstance(payload, str) else payload
+    return None
+
+
+class ServerMetrics:
+    """Latency histograms and counters of tool calls and of Kusto queries per region.
+
+    A tool call is timed end to end, whether it was served from the result
+    cache or not, and counts the rows and bytes of the responses it rendered
+    and the time spent rendering them. A Kusto query is timed from the wait
+    for a pooled client to the end of its execution, and adds up the
+    resource usage Kusto reports for it.
+    """
+
+    def __init__(self):
+        self.tools: Dict[str, _ToolStats] = {}
+        self.regions: Dict[str, _RegionStats] = {}
+        self._cluster_regions = {cluster_uri: region_name for region_name, cluster_uri in region_uris.items()}
+
+    def tool(self, tool_name: str) -> _ToolStats:
+        return self.tools.setdefault(tool_name, _ToolStats())
+
+    def region(self, cluster_uri: str) -> _RegionStats:
+        return self.regions.setdefault(self._cluster_regions.get(cluster_uri, cluster_uri), _RegionStats())
+
+    def record_query(self, cluster_uri: str, lease_wait: float, elapsed: float, consumption: Optional[Dict[str, Any]]):
+        stats = self.region(cluster_uri)
+        stats.queries += 1
+        stats.lease_wait.observe(lease_wait)
+        stats.latency.observe(elapsed)
+        if not consumption:
+            return
+        try:
+            usage = consumption.get("resource_usage", {})
+            inputs = consumption.get("input_dataset_statistics", {})
+            stats.execution_seconds += float(consumption.get("ExecutionTime", 0))
+            stats.cpu_seconds += _timespan_seconds(usage.get("cpu", {}).get("total cpu", "00:00:00"))
+            stats.peak_memory_bytes = max(stats.peak_memory_bytes, int(usage.get("memory", {}).get("peak_per_node", 0)))
+            stats.extents_scanned += int(inputs.get("extents", {}).get("scanned", 0))
+            stats.extents_total += int(inputs.get("extents", {}).get("total", 0))
+            stats.rows_scanned += int(inputs.get("rows", {}).get("scanned", 0))
+            stats.rows_total += int(inputs.get("rows", {}).get("total", 0))
+        except (AttributeError, TypeError, ValueError):
+            logger.debug("Unexpected QueryResourceConsumption payload: %s", consumption)
+
+    def render_text(self) -> str:
+        lines = ["Tools:"]
+        for name, stats in sorted(self.tools.items()):
+            lines.append(
+                f"{name}: calls {stats.calls}, errors {stats.errors}, cache hits {stats.cache_hits}, "
+                f"p50 {stats.latency.quantile(0.5):g}s, p99 {stats.latency.quantile(0.99):g}s, "
+                f"rows {stats.rows}, bytes {stats.bytes}, formatting {stats.format_seconds:.3f}s"
+            )
+        lines.append("")
+        lines.append("Kusto queries per region:")
+        for name, stats in sorted(self.regions.items()):
+            lines.append(
+                f"{name}: queries {stats.queries}, errors {stats.errors}, "
+                f"p50 {stats.latency.quantile(0.5):g}s, p99 {stats.latency.quantile(0.99):g}s, "
+                f"client wait p99 {stats.lease_wait.quantile(0.99):g}s, execution {stats.execution_seconds:.3f}s, "
+                f"cpu {stats.cpu_seconds:.3f}s, peak memory {stats.peak_memory_bytes} bytes, "
+                f"extents scanned {stats.extents_scanned}/{stats.extents_total}, rows scanned {stats.rows_scanned}/{stats.rows_total}"
+            )
+        lines.append("")
+        lines.append(f"Tokens: {kusto_tokens.stats()}, fetch p99 {kusto_tokens.fetch_latency.quantile(0.99):g}s")
+        lines.append(f"Result cache: {result_cache.stats()}")
+        return "\n".join(lines)
+
+    def render_openmetrics(self) -> str:
+        lines = []
+
+        def braces(labels: str) -> str:
+            return f"{{{labels.rstrip(',')}}}" if labels else ""
+
+        def histogram(name: str, help_text: str, series: Dict[str, Histogram]):
+            lines.append(f"# TYPE {name} histogram")
+            lines.append(f"# UNIT {name} seconds")
+            lines.append(f"# HELP {name} {help_text}")
+            for labels, values in series.items():
+                for le, count in values.cumulative():
+                    lines.append(f'{name}_bucket{{{labels}le="{le}"}} {count}')
+                lines.append(f"{name}_count{braces(labels)} {values.count}")
+                lines.append(f"{name}_sum{braces(labels)} {values.sum}")
+
+        def counter(name: str, help_text: str, series: Dict[str, float]):
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"# HELP {name} {help_text}")
+            for labels, value in series.items():
+                lines.append(f"{name}_total{braces(labels)} {value}")
+
+        def gauge(name: str, help_text: str, series: Dict[str, float]):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"# HELP {name} {help_text}")
+            for labels, value in series.items():
+                lines.append(f"{name}{braces(labels)} {value}")
+
+        tools = {f'tool="{name}",': stats for name, stats in sorted(self.tools.items())}
+        regions = {f'region="{name}",': stats for name, stats in sorted(self.regions.items())}
+        histogram("kusto_mcp_tool_latency_seconds", "Tool call latency.", {labels: stats.latency for labels, stats in tools.items()})
+        counter("kusto_mcp_tool_calls", "Tool calls.", {labels: stats.calls for labels, stats in tools.items()})
+        counter("kusto_mcp_tool_errors", "Tool calls that failed.", {labels: stats.errors for labels, stats in tools.items()})
+        counter("kusto_mcp_tool_cache_hits", "Tool calls served from the result cache.", {labels: stats.cache_hits for labels, stats in tools.items()})
+        counter("kusto_mcp_tool_rows", "Rows rendered into tool responses.", {labels: stats.rows for labels, stats in tools.items()})
+        counter("kusto_mcp_tool_bytes", "Bytes of tool responses.", {labels: stats.bytes for labels, stats in tools.items()})
+        counter("kusto_mcp_tool_format_seconds", "Time spent rendering rows.", {labels: stats.format_seconds for labels, stats in tools.items()})
+        histogram("kusto_mcp_query_latency_seconds", "Kusto query latency including the wait for a pooled client.", {labels: stats.latency for labels, stats in regions.items()})
+        histogram("kusto_mcp_query_client_wait_seconds", "Wait for a pooled Kusto client.", {labels: stats.lease_wait for labels, stats in regions.items()})
+        counter("kusto_mcp_queries", "Kusto queries.", {labels: stats.queries for labels, stats in regions.items()})
+        counter("kusto_mcp_query_errors", "Kusto queries that failed.", {labels: stats.errors for labels, stats in regions.items()})
+        counter("kusto_mcp_query_execution_seconds", "Execution time reported by Kusto.", {labels: stats.execution_seconds for labels, stats in regions.items()})
+        counter("kusto_mcp_query_cpu_seconds", "CPU time reported by Kusto.", {labels: stats.cpu_seconds for labels, stats in regions.items()})
+        gauge("kusto_mcp_query_peak_memory_bytes", "Largest per-node peak memory reported by Kusto.", {labels: stats.peak_memory_bytes for labels, stats in regions.items()})
+        counter("kusto_mcp_query_extents_scanned", "Extents scanned by Kusto.", {labels: stats.extents_scanned for labels, stats in regions.items()})
+        counter("kusto_mcp_query_rows_scanned", "Rows scanned by Kusto.", {labels: stats.rows_scanned for labels, stats in regions.items()})
+        histogram("kusto_mcp_token_fetch_seconds", "AAD token fetch latency.", {"": kusto_tokens.fetch_latency})
+        counter("kusto_mcp_token_cache", "Token cache lookups.", {f'result="{name}",': kusto_tokens.stats()[name] for name in ("hits", "misses")})
+        counter("kusto_mcp_result_cache", "Result cache lookups.", {f'result="{name}",': result_cache.stats()[name] for name in ("hits", "misses")})
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+server_metrics = ServerMetrics()
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Runs around every client session.
+
+    Over stdio the session lasts as long as the process, so pooled clients
+    are closed with it. Over HTTP the pools and caches are shared by all
+    sessions and stay warm between them; idle clients are closed by the pool.
+    """
+    try:
+        yield
+    finally:
+        if TRANSPORT == "stdio":
+            await kusto_clients.close()
+        logger.info("Token cache stats: %s", kusto_tokens.stats())
+        logger.info("Result cache stats: %s", result_cache.stats())
+        if METRICS_DUMP_PATH:
+            with open(METRICS_DUMP_PATH, "w") as f:
+                f.write(server_metrics.render_openmetrics())
+
+
+# Initialize the FastMCP server
+mcp = FastMCP(lifespan=lifespan, host=HTTP_HOST, port=HTTP_PORT)
+
+# Appended to every tool query after its projection. Rows are ordered by
+# TIMESTAMP with a hash of the projected row as tiebreak, and a page resumes
+# after the (TIMESTAMP, tiebreak) of the last row of the previous page. The
+# cursor time is taken from tostring(TIMESTAMP) so it keeps Kusto's full
+# precision, and page_limit is one more than the page size so that the
+# extra row tells whether another page exists.
+PAGE_CLAUSE = """| extend _tiebreak = hash(tostring(pack_all()))
+        | extend _cursor_time = tostring(TIMESTAMP)
+        | where isempty(cursor_time) or TIMESTAMP > todatetime(cursor_time) or (TIMESTAMP == todatetime(cursor_time) and _tiebreak > cursor_tiebreak)
+        | order by TIMESTAMP asc, _tiebreak asc
+        | take page_limit"""
+
+
+def encode_cursor(row: Any) -> str:
+    raw = json.dumps([row["_cursor_time"], row["_tiebreak"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[str, int]:
+    """Return the (cursor_time, cursor_tiebreak) to resume after, raising ValueError for a malformed cursor."""
+    if not cursor:
+        return "", 0
+    try:
+        cursor_time, cursor_tiebreak = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(cursor_time), int(cursor_tiebreak)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+
+def time_shards(start_time: str, end_time: str, cursor_time: str = "") -> Optional[List[Tuple[str, str]]]:
+    """Split [start_time, end_time] into consecutive sub-windows of SHARD_SPAN_MINUTES.
+
+    Returns None when sharding is disabled, the times cannot be parsed or the
+    window fits in one shard. Sub-windows before a resume cursor are skipped.
+    The tool queries use an inclusive between(), so every shard but the last
+    ends one Kusto tick (100ns) before the next one starts.
+    """
+    start, end = parse_time(start_time), parse_time(end_time)
+    resume = parse_time(cursor_time)
+    if resume and start and resume > start:
+        start = resume
+    span = timedelta(minutes=SHARD_SPAN_MINUTES)
+    if SHARD_SPAN_MINUTES <= 0 or not start or not end or end - start <= span:
+        return None
+
+    shards = []
+    while start + span < end:
+        boundary = start + span
+        last_tick = (boundary - timedelta(microseconds=1)).strftime("%Y-%m-%dT%H:%M:%S.%f") + "9Z"
+        shards.append((start.isoformat(), last_tick))
+        start = boundary
+    shards.append((start.isoformat(), end_time))
+    return shards
+
+
+def _row_order(row: Any) -> Tuple[str, int]:
+    # tostring(TIMESTAMP) has a fixed width, so the strings sort chronologically
+    return row["_cursor_time"], row["_tiebreak"]
+
+
+class ResultRows:
+    """Iterator over the rows of a result as column-to-value dicts, with the Kusto type of every column."""
+
+    def __init__(self, column_types: Dict[str, str], rows: Iterable[Dict[str, Any]]):
+        self.column_types = column_types
+        self._rows = iter(rows)
+
+    def __iter__(self) -> "ResultRows":
+        return self
+
+    def __next__(self) -> Dict[str, Any]:
+        return next(self._rows)
+
+
+def _table_rows(table: Any) -> ResultRows:
+    column_types = {column.column_name: column.column_type for column in table.columns}
+    return ResultRows(column_types, (dict(zip(column_types, row)) for row in table))
+
+
+async def _execute_tables(cluster_uri: str, query: str, parameters: Dict[str, Any]) -> List[ResultRows]:
+    """Execute query and return the rows of every primary result, one iterator of column-to-value dicts per tabular statement."""
+    started = time.perf_counter()
+    async with kusto_clients.lease(cluster_uri) as client:
+        leased = time.perf_counter()
         crp = ClientRequestProperties()
         crp.client_request_id = "kusto-mcp-server" + str(uuid.uuid4())
-        crp.set_parameter("target_server_name", server_name)
-        crp.set_parameter("start_time", start_time)
-        crp.set_parameter("end_time", end_time)
-        crp.set_parameter("search_key", search_key)
+        for name, value in parameters.items():
+            crp.set_parameter(name, value)
 
-        query = """
-        declare query_parameters(target_server_name:string, start_time: string, end_time: string, search_key: string);
-        let start = todatetime(start_time);
-        let end = todatetime(end_time);
-        MonMySQLSideCar
+        try:
+            response = await client.execute_query(DATABASE_NAME, query, crp)
+        except Exception:
+            server_metrics.region(cluster_uri).errors += 1
+            raise
+    server_metrics.record_query(cluster_uri, leased - started, time.perf_counter() - started, query_resource_consumption(response))
+    return [_table_rows(table) for table in response.primary_results]
+
+
+async def _execute(cluster_uri: str, query: str, parameters: Dict[str, Any]) -> ResultRows:
+    return (await _execute_tables(cluster_uri, query, parameters))[0]
+
+
+async def _execute_sharded(cluster_uri: str, query: str, parameters: Dict[str, Any], shards: List[Tuple[str, str]], limit: int) -> ResultRows:
+    """Run query over each shard concurrently and k-way merge the ordered shard results.
+
+    Shards cover consecutive time ranges, so once the shards up to some point
+    together hold limit rows the later ones cannot contribute and are cancelled.
+    """
+    semaphore = asyncio.Semaphore(SHARD_CONCURRENCY)
+
+    async def run_shard(shard_start: str, shard_end: str) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+        async with semaphore:
+            rows = await _execute(cluster_uri, query, {**parameters, "start_time": shard_start, "end_time": shard_end})
+            return rows.column_types, list(rows)
+
+    tasks = [asyncio.create_task(run_shard(*shard)) for shard in shards]
+    results = []
+    try:
+        for task in tasks:
+            results.append(await task)
+            if sum(len(rows) for _, rows in results) >= limit:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return ResultRows(results[0][0], itertools.islice(heapq.merge(*(rows for _, rows in results), key=_row_order), limit))
+
+
+AUTO_REGION = "auto"
+
+# Cheapest evidence that a server lives on a cluster: any recent engine log line
+LOCATE_QUERY = f"""
+        declare query_parameters(target_server_name:string);
+        MonMySQLLogs
+        | where TIMESTAMP > ago({LOCATE_LOOKBACK_HOURS}h)
         | where LogicalServerName == target_server_name
-        | where TIMESTAMP between(start .. end)
-        | where message contains search_key
-        | project TIMESTAMP, message
-        | limit 500
+        | take 1
+        | project LogicalServerName
         """
-        
-        try:
-            response = client.execute_query(DATABASE_NAME, query, crp)
-            for row in response.primary_results[0]:
-                result.append(f"Timestamp: {row['TIMESTAMP']}, Message: {row['message']}")
-        except Exception as e:
-            return f"Error executing query: {str(e)}"
 
-        return "\n---\n".join(result)
-    
-@mcp.tool()
-def get_sidecar_logs_for_actor(region_name: str, server_name: str, actor_name:str, start_time: str, end_time: str, search_key: str = None) -> str:
-    """Get messages for the sidecar container of mysql server for a particular actor between the given time range.
-    
-    Args:
-        region_name: Name of the region where server is deployed
-        server_name: Name of the server
-        actor_name: Name of the actor
-        start_time: Start time of the query
-        end_time: End time of the query
-        search_key: Optional search key to filter logs
+# Server name to region, filled by locate_region
+server_regions: Dict[str, str] = {}
+_locating: Dict[str, "asyncio.Task[Optional[str]]"] = {}
+
+
+async def _probe_regions(server_name: str) -> Optional[str]:
+    async def probe(region_name: str, cluster_uri: str) -> Optional[str]:
+        rows = await _execute(cluster_uri, LOCATE_QUERY, {"target_server_name": server_name})
+        return region_name if next(rows, None) else None
+
+    tasks = [asyncio.create_task(probe(region_name, cluster_uri)) for region_name, cluster_uri in region_uris.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                region_name = await next_done
+            except Exception:
+                logger.warning("Region probe for server %s failed", server_name, exc_info=True)
+                continue
+            if region_name:
+                server_regions[server_name] = region_name
+                return region_name
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def locate_region(server_name: str) -> Optional[str]:
+    """Find the region hosting server_name by probing every regional cluster at once.
+
+    The first cluster that has the server answers and the remaining probes are
+    cancelled. Results are remembered in server_regions, and concurrent
+    lookups for the same server share one round of probes.
     """
+    region_name = server_regions.get(server_name)
+    if region_name:
+        return region_name
+
+    task = _locating.get(server_name)
+    if task is None:
+        task = asyncio.create_task(_probe_regions(server_name))
+        _locating[server_name] = task
+        task.add_done_callback(lambda _: _locating.pop(server_name, None))
+    return await asyncio.shield(task)
+
+
+async def _resolve_cluster(region_name: str, parameters: Dict[str, Any]) -> Tuple[str, str]:
+    """Return the (region_name, cluster_uri) a tool call runs against, raising ValueError with a message for the caller.
+
+    A region_name of "auto" is resolved from the target_server_name parameter
+    with locate_region.
+    """
+    if region_name == AUTO_REGION:
+        server_name = parameters.get("target_server_name")
+        if not server_name:
+            raise ValueError(f'region_name "{AUTO_REGION}" is only supported by tools that take a server name')
+        region_name = await locate_region(server_name)
+        if not region_name:
+            raise ValueError(f"Server {server_name} was not found in any region")
+
     cluster_uri = region_uris.get(region_name)
     if not cluster_uri:
-        return f"Region {region_name} is not supported"
-    
-    kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_uri)
+        raise ValueError(f"Region {region_name} is not supported")
+    return region_name, cluster_uri
 
-    result = []
 
-    with KustoClient(kcsb) as client:
-        crp = ClientRequestProperties()
-        crp.client_request_id = "kusto-mcp-server" + str(uuid.uuid4())
-        crp.set_parameter("target_server_name", server_name)
-        crp.set_parameter("actor_name", actor_name)
-        crp.set_parameter("start_time", start_time)
-        crp.set_parameter("end_time", end_time)
-        crp.set_parameter("search_key", search_key)
-
-        query = """
-        declare query_parameters(target_server_name:string, actor_name:string, start_time: string, end_time: string, search_key: string);
+async def _cached(
+    tool_name: str,
+    region_name: str,
+    query: str,
+    parameters: Dict[str, Any],
+    produce: Callable[[], Awaitable[str]],
+    options: Optional[Dict[str, Any]] = None,
+    cache: bool = True,
+    output_format: str = "text",
+) -> str:
+    """Serve a tool response from the result cache, or produce and store it, and add the cache status as a note.
+
+    Entries are keyed on the tool, region, query and parameters with the time
+    window normalized, plus any options that change how rows are rendered.
+    Responses that depend on state kept between calls pass cache=False and
+    are always produced. The call is recorded in server_metrics.
+    """
+    stats = server_metrics.tool(tool_name)
+    started = time.perf_counter()
+    try:
+        if not cache:
+            text = await produce()
+            stats.bytes += len(text.encode("utf-8"))
+            return text
+
+        key = ResultCache.key(tool_name, region_name, query, parameters, options)
+        text = await result_cache.get(key)
+        status = "hit"
+
+        if text is None:
+            status = "miss"
+            text = await produce()
+            await result_cache.put(key, text, result_ttl(parameters.get("end_time")))
+        else:
+            stats.cache_hits += 1
+    except Exception:
+        stats.errors += 1
+        raise
+    finally:
+        stats.calls += 1
+        stats.latency.observe(time.perf_counter() - started)
+
+    stats.bytes += len(text.encode("utf-8"))
+    return with_notes(text, output_format, {"cache": {"status": status, "hits": result_cache.hits, "misses": result_cache.misses}})
+
+
+# Kusto indexes terms of at least three alphanumeric characters
+_INDEXED_TERM = re.compile(r"^[A-Za-z0-9]{3,}$")
+
+
+@dataclass
+class SearchFilter:
+    declarations: str
+    clause: str
+    parameters: Dict[str, str]
+
+
+def search_filter(search_key: Optional[str], column: str = "message") -> SearchFilter:
+    """Plan the predicate for a tool's search_key.
+
+    search_key may hold alternatives separated by "|". Alternatives that are
+    whole indexed terms are matched with has / has_any, which use the term
+    index, a trailing "*" on such a term turns it into an indexed hasprefix,
+    and anything else falls back to a contains substring scan. Without a
+    search_key there is no predicate at all.
+
+    Returns the query_parameters declarations (each followed by ", "), the
+    where clause and the parameter values, with one parameter per alternative.
+    """
+    alternatives = [alternative.strip() for alternative in (search_key or "").split("|") if alternative.strip()]
+    if not alternatives:
+        return SearchFilter("", "", {})
+
+    parameters = {f"search_key_{i}": alternative.rstrip("*") for i, alternative in enumerate(alternatives)}
+    terms, predicates = [], []
+    for name, alternative in zip(parameters, alternatives):
+        if _INDEXED_TERM.match(alternative):
+            terms.append(name)
+        elif alternative.endswith("*") and _INDEXED_TERM.match(parameters[name]):
+            predicates.append(f"{column} hasprefix {name}")
+        else:
+            predicates.append(f"{column} contains {name}")
+    if len(terms) == 1:
+        predicates.insert(0, f"{column} has {terms[0]}")
+    elif terms:
+        predicates.insert(0, f"{column} has_any ({', '.join(terms)})")
+
+    declarations = "".join(f"{name}: string, " for name in parameters)
+    return SearchFilter(declarations, f"| where {' or '.join(predicates)}", parameters)
+
+
+OUTPUT_FORMATS = ("text", "tsv", "csv", "json")
+
+
+def _json_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _cell(value: Any) -> Any:
+    """A tsv or csv value: dynamic values are written as JSON, nulls as empty cells and anything else as is."""
+    if value is None:
+        return ""
+    return json.dumps(value, default=str) if isinstance(value, (dict, list)) else value
+
+
+class ResultWriter:
+    """Renders result rows in one of OUTPUT_FORMATS as they are streamed in, within a byte budget.
+
+    text is one format_row line per row. tsv and csv write the column header
+    once and then the values only; json is columnar, with the column names and
+    Kusto types once followed by an array of value arrays. Columns starting with an
+    underscore are internal to the query and left out.
+
+    A row that would take the output past max_bytes, counting the bytes that
+    close a json object, is not written and write returns False, so output is
+    always cut at a row boundary. The first row is written regardless.
+    """
+
+    def __init__(
+        self,
+        output_format: str,
+        format_row: Callable[[Any], str],
+        column_types: Optional[Dict[str, str]] = None,
+        max_bytes: int = RESPONSE_MAX_BYTES,
+    ):
+        self.output_format = output_format
+        self.format_row = format_row
+        self.column_types = column_types or {}
+        self.max_bytes = max_bytes
+        self.rows = 0
+        self.bytes = 0
+        self.truncated = False
+        self._columns: List[str] = []
+        self._buffer = io.StringIO()
+
+    def _csv_line(self, values: List[Any]) -> str:
+        line = io.StringIO()
+        csv.writer(line, lineterminator="\n").writerow(values)
+        return line.getvalue()
+
+    def _header(self, row: Dict[str, Any]) -> str:
+        self._columns = [column for column in row if not column.startswith("_")]
+        if self.output_format == "tsv":
+            return "\t".join(self._columns) + "\n"
+        if self.output_format == "csv":
+            return self._csv_line(self._columns)
+        if self.output_format == "json":
+            columns = [{"name": column, "type": self.column_types.get(column, "string")} for column in self._columns]
+            return '{"columns": ' + json.dumps(columns) + ', "rows": ['
+        return ""
+
+    def _render(self, row: Dict[str, Any]) -> str:
+        values = [row[column] for column in self._columns]
+        if self.output_format == "tsv":
+            return "\t".join(str(_cell(value)).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n") for value in values) + "\n"
+        if self.output_format == "csv":
+            return self._csv_line([_cell(value) for value in values])
+        if self.output_format == "json":
+            return ("," if self.rows else "") + json.dumps([_json_value(value) for value in values], default=str)
+        return ("\n---\n" if self.rows else "") + self.format_row(row)
+
+    def write(self, row: Dict[str, Any]) -> bool:
+        chunk = (self._header(row) if self.rows == 0 else "") + self._render(row)
+        size = len(chunk.encode("utf-8"))
+        closing = 2 if self.output_format == "json" else 0
+        if self.rows and self.bytes + size + closing > self.max_bytes:
+            self.truncated = True
+            return False
+        self._buffer.write(chunk)
+        self.bytes += size
+        self.rows += 1
+        return True
+
+    def getvalue(self) -> str:
+        text = self._buffer.getvalue()
+        if self.output_format == "json":
+            return text + "]}" if self.rows else '{"columns": [], "rows": []}'
+        return text
+
+
+def _note_lines(notes: Dict[str, Any]) -> Iterator[str]:
+    """The notes of a text response, phrased for a reader."""
+    truncated = notes.get("truncated")
+    if truncated:
+        yield f"output truncated after {truncated['rows']} rows to stay within {truncated['max_bytes']} bytes"
+    if "next_cursor" in notes:
+        yield f"more rows available: call again with cursor=\"{notes['next_cursor']}\""
+    follow = notes.get("follow")
+    if follow:
+        if follow["more"]:
+            yield "more new rows available: call again right away"
+        yield (
+            f"follow {follow['id']}: {follow['new_rows']} new rows, call again with follow=true and cursor=\"{follow['id']}\" for newer rows; "
+            f"the latest {follow['kept_rows']} rows are kept at follow://{follow['id']}"
+        )
+    cache = notes.get("cache")
+    if cache:
+        yield f"cache {cache['status']}: {cache['hits']} hits, {cache['misses']} misses"
+
+
+def with_notes(text: str, output_format: str, notes: Dict[str, Any]) -> str:
+    """Add notes such as the next page's cursor to a rendered response.
+
+    A json response gets the notes as members of its object, so it stays
+    valid JSON. Other responses get one bracketed line per note after their
+    rows, each after a blank line, so a tsv or csv table ends at the first
+    blank line.
+    """
+    if not notes:
+        return text
+    if output_format == "json":
+        return text[:-1] + ", " + json.dumps(notes)[1:]
+    if output_format != "text":
+        # tsv and csv rows end in a line terminator already
+        text = text.removesuffix("\n")
+    return text + "".join(f"\n\n[{line}]" for line in _note_lines(notes))
+
+
+# Variable parts of log lines masked to form a template, applied in order
+VARIABLE_TOKEN_PATTERNS = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<TS>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<GUID>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<IP>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b|\b[0-9a-fA-F]{16,}\b"), "<HEX>"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "<N>"),
+    # Any other word with a digit in it, such as a pod or volume suffix, is an identifier as a whole
+    (re.compile(r"\b(?=\w*\d)\w+\b"), "<ID>"),
+]
+
+
+def mask_variables(line: str) -> str:
+    for pattern, placeholder in VARIABLE_TOKEN_PATTERNS:
+        line = pattern.sub(placeholder, line)
+    return line
+
+
+@dataclass
+class _Template:
+    count: int
+    first: Any
+    last: Any
+    example: str
+
+
+class TemplateCompactor:
+    """Groups formatted log lines by template in a single pass.
+
+    A line's template is the line with numbers, GUIDs, IPs, hex values,
+    timestamps and other words containing digits masked. Memory is bounded by max_templates: once that many
+    templates are tracked, lines of new templates are only counted as other.
+    Templates are rendered in the order they first appeared.
+    """
+
+    def __init__(self, max_templates: int = COMPACT_MAX_TEMPLATES):
+        self.max_templates = max_templates
+        self._templates: Dict[str, _Template] = {}
+        self._other: Optional[_Template] = None
+
+    def add(self, timestamp: Any, line: str):
+        template = mask_variables(line)
+        entry = self._templates.get(template)
+        if entry is None and len(self._templates) < self.max_templates:
+            entry = self._templates[template] = _Template(0, timestamp, timestamp, line)
+        elif entry is None:
+            entry = self._other = self._other or _Template(0, timestamp, timestamp, line)
+        entry.count += 1
+        entry.last = timestamp
+
+    def render(self) -> str:
+        lines = [
+            f"Count: {entry.count}, First: {entry.first}, Last: {entry.last}, Template: {template.removeprefix('Timestamp: <TS>, ')}, Example: {entry.example}"
+            for template, entry in self._templates.items()
+        ]
+        if self._other:
+            lines.append(f"Count: {self._other.count}, First: {self._other.first}, Last: {self._other.last}, Template: <lines of {self.max_templates}+ other templates>, Example: {self._other.example}")
+        return "\n---\n".join(lines)
+
+
+@dataclass
+class FollowStream:
+    """Watermark and recent rows of one followed log stream.
+
+    The watermark is the (cursor time, tiebreak) of the last row returned,
+    so the next poll resumes after it with the paging predicate. key ties
+    the stream to the tool, region and filter arguments it was started with,
+    and every poll reads from the start_time of the first call.
+    """
+    follow_id: str
+    key: str
+    start_time: str
+    cursor_time: str = ""
+    cursor_tiebreak: int = 0
+    rows: Deque[str] = field(default_factory=lambda: deque(maxlen=FOLLOW_BUFFER_ROWS))
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class FollowRegistry:
+    """Follow streams by follow id.
+
+    Every follow call without a follow id starts a new stream under a random
+    id that only its caller learns, so callers sharing a server never share a
+    watermark or read each other's rows. At most max_streams streams are
+    kept; the least recently polled is dropped first.
+    """
+
+    def __init__(self, max_streams: int = FOLLOW_MAX_STREAMS):
+        self.max_streams = max_streams
+        self._streams: "OrderedDict[str, FollowStream]" = OrderedDict()
+
+    @staticmethod
+    def key(tool_name: str, region_name: str, parameters: Dict[str, Any]) -> str:
+        filters = {name: value for name, value in parameters.items() if name not in ("start_time", "end_time")}
+        raw = json.dumps([tool_name, region_name, filters], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def start(self, tool_name: str, region_name: str, parameters: Dict[str, Any]) -> FollowStream:
+        stream = FollowStream(secrets.token_urlsafe(16), self.key(tool_name, region_name, parameters), parameters["start_time"])
+        self._streams[stream.follow_id] = stream
+        while len(self._streams) > self.max_streams:
+            self._streams.popitem(last=False)
+        return stream
+
+    def resume(self, follow_id: str, tool_name: str, region_name: str, parameters: Dict[str, Any]) -> FollowStream:
+        """The stream follow_id, raising ValueError with a message for the caller if it is unknown or was started with other arguments."""
+        stream = self._streams.get(follow_id)
+        if stream is None or stream.key != self.key(tool_name, region_name, parameters):
+            raise ValueError(f"Unknown follow id {follow_id} for these arguments, call with follow=true and no cursor to start a new one")
+        self._streams.move_to_end(follow_id)
+        return stream
+
+    def get(self, follow_id: str) -> Optional[FollowStream]:
+        return self._streams.get(follow_id)
+
+
+follows = FollowRegistry()
+
+
+# Histogram bin sizes the summary tools choose from
+SUMMARY_STEPS = [
+    timedelta(minutes=1), timedelta(minutes=5), timedelta(minutes=10), timedelta(minutes=15),
+    timedelta(minutes=30), timedelta(hours=1), timedelta(hours=2), timedelta(hours=3),
+    timedelta(hours=6), timedelta(hours=12), timedelta(days=1),
+]
+
+
+def summary_step(start_time: str, end_time: str) -> str:
+    """Smallest bin size that splits the window into at most SUMMARY_BUCKETS bins, as a Kusto timespan.
+
+    Windows too wide for the largest of SUMMARY_STEPS get bins of whole days.
+    """
+    start, end = parse_time(start_time), parse_time(end_time)
+    window = end - start if start and end else SUMMARY_STEPS[-1]
+    step = next((step for step in SUMMARY_STEPS if step * SUMMARY_BUCKETS >= window), None)
+    if step is None:
+        step = timedelta(days=math.ceil(window / (SUMMARY_BUCKETS * timedelta(days=1))))
+    hours, seconds = divmod(int(step.total_seconds()), 3600)
+    return f"{hours // 24}.{hours % 24:02}:{seconds // 60:02}:{seconds % 60:02}"
+
+
+def summary_query(table: str, declarations: str, filters: str, group_column: Optional[str]) -> str:
+    """Build the two-statement query behind a summary tool.
+
+    declarations are the tool's query_parameters (each followed by ", ") and
+    filters its where clauses over table. The first result is a count of log
+    lines per time bin, split by group_column when the table has one (values
+    beyond the busiest SUMMARY_TOP_GROUPS are folded into "other"). The second
+    result holds the most frequent message templates found by Kusto's reduce
+    operator.
+    """
+    if group_column:
+        histogram = f"""let top_groups = logs | summarize count() by {group_column} | top {SUMMARY_TOP_GROUPS} by count_ | project {group_column};
+        logs
+        | extend {group_column} = iff({group_column} in (top_groups), {group_column}, "other")
+        | summarize Count = count() by bin(TIMESTAMP, step_span), {group_column}
+        | order by TIMESTAMP asc, Count desc;"""
+    else:
+        histogram = """logs
+        | summarize Count = count() by bin(TIMESTAMP, step_span)
+        | order by TIMESTAMP asc;"""
+
+    return f"""
+        declare query_parameters({declarations}step: string);
         let start = todatetime(start_time);
         let end = todatetime(end_time);
-        MonMySQLSideCar
-        | where LogicalServerName == target_server_name
-        | where SourceContext contains actor_name
-        | where TIMESTAMP between(start .. end)
-        | where message contains search_key
-        | project TIMESTAMP, message
+        let step_span = totimespan(step);
+        let logs = materialize({table}
+        {filters});
+        {histogram}
+        logs
+        | reduce by message
+        | top {SUMMARY_TOP_TEMPLATES} by Count
+        | project Count, Pattern, Representative
         """
-        
-        try:
-            response = client.execute_query(DATABASE_NAME, query, crp)
-            for row in response.primary_results[0]:
-                result.append(f"Timestamp: {row['TIMESTAMP']}, Message: {row['message']}")
-        except Exception as e:
-            return f"Error executing query: {str(e)}"
 
-        return "\n---\n".join(result)
 
-@mcp.tool()
-def get_director_logs(region_name: str, start_time: str, end_time: str, search_key: str = None) -> str:
-    """Get messages for the director container or kubernetes(k8s) logs of mysql server between the given time range.
+async def _run_summary(tool_name: str, region_name: str, query: str, parameters: Dict[str, Any], group_column: Optional[str]) -> str:
+    """Execute a summary_query and format its histogram and top templates compactly."""
+    try:
+        region_name, cluster_uri = await _resolve_cluster(region_name, parameters)
+    except ValueError as e:
+        return str(e)
+    parameters = {**parameters, "step": summary_step(parameters["start_time"], parameters["end_time"])}
 
-    Args:
-        region_name: Name of the region where server is deployed
-        start_time: Start time of the query
-        end_time: End time of the query
-        search_key: Optional search key to filter logs
+    async def produce() -> str:
+        histogram, templates = await _execute_tables(cluster_uri, query, parameters)
+        started = time.perf_counter()
+        lines = [f"Log lines per {parameters['step']} bin:"]
+        for row in histogram:
+            group = f", {group_column}: {row[group_column]}" if group_column else ""
+            lines.append(f"Timestamp: {row['TIMESTAMP']}{group}, Count: {row['Count']}")
+        lines.append("")
+        lines.append("Most frequent message templates:")
+        for row in templates:
+            lines.append(f"Count: {row['Count']}, Pattern: {row['Pattern']}, Example: {row['Representative']}")
+        stats = server_metrics.tool(tool_name)
+        # Every line but the two headings and the blank line between them is a row
+        stats.rows += len(lines) - 3
+        stats.format_seconds += time.perf_counter() - started
+        return "\n".join(lines)
+
+    try:
+        return await _cached(tool_name, region_name, query, parameters, produce)
+    except Exception as e:
+        return f"Error executing query: {str(e)}"
+
+
+async def _run_query(
+    tool_name: str,
+    region_name: str,
+    query: str,
+    parameters: Dict[str, Any],
+    format_row: Callable[[Any], str],
+    page_size: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    shardable: bool = True,
+    compact: bool = False,
+    output_format: str = "text",
+    follow: Optional[FollowStream] = None,
+) -> str:
+    """Execute a tool's query on the region's cluster and format one page of the primary result rows.
+
+    Only the requested page is fetched from Kusto, split into concurrent time
+    shards when the window is wide. When more rows follow, the response
+    carries the cursor for the next page as a note (see with_notes). Rows are
+    rendered by ResultWriter in output_format as they are read; a page that
+    reaches the byte budget ends early and its cursor resumes after the last
+    row written. With compact, the page is returned as message templates by
+    TemplateCompactor instead, always as text. Responses go through the
+    result cache.
+
+    With follow, the page starts after the stream's watermark instead of
+    cursor, the watermark moves to the last row returned and the rows are
+    added to the stream's recent rows; such responses are not cached.
+
+    Queries whose rows aggregate over the window must pass shardable=False.
     """
-    cluster_uri = region_uris.get(region_name)
-    if not cluster_uri:
-        return f"Region {region_name} is not supported"
-    
-    kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_uri)
+    if output_format not in OUTPUT_FORMATS:
+        return f"Unsupported output_format {output_format}, expected one of {', '.join(OUTPUT_FORMATS)}"
+    try:
+        region_name, cluster_uri = await _resolve_cluster(region_name, parameters)
+        cursor_time, cursor_tiebreak = (follow.cursor_time, follow.cursor_tiebreak) if follow else decode_cursor(cursor)
+    except ValueError as e:
+        return str(e)
 
-    result = []
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    # Compacted templates are always text
+    response_format = "text" if compact else output_format
+    parameters = {
+        **parameters,
+        "cursor_time": cursor_time,
+        "cursor_tiebreak": str(cursor_tiebreak),
+        "page_limit": str(page_size + 1),
+    }
+
+    async def produce() -> str:
+        shards = time_shards(parameters["start_time"], parameters["end_time"], cursor_time) if shardable else None
+        if shards:
+            rows = await _execute_sharded(cluster_uri, query, parameters, shards, page_size + 1)
+        else:
+            rows = await _execute(cluster_uri, query, parameters)
+
+        started = time.perf_counter()
+        compactor = TemplateCompactor() if compact else None
+        writer = None if compact else ResultWriter(output_format, format_row, rows.column_types)
+        count = 0
+        last_row = None
+        next_cursor = None
+        for row in rows:
+            if count == page_size:
+                next_cursor = encode_cursor(last_row)
+                break
+            if compactor:
+                compactor.add(row["TIMESTAMP"], format_row(row))
+            elif not writer.write(row):
+                next_cursor = encode_cursor(last_row)
+                break
+            if follow:
+                follow.rows.append(format_row(row))
+            count += 1
+            last_row = row
+
+        notes: Dict[str, Any] = {}
+        if compactor:
+            text = compactor.render()
+        else:
+            text = writer.getvalue()
+            if writer.truncated:
+                notes["truncated"] = {"rows": count, "max_bytes": writer.max_bytes}
+        if follow:
+            if count:
+                follow.cursor_time, follow.cursor_tiebreak = last_row["_cursor_time"], last_row["_tiebreak"]
+            notes["follow"] = {"id": follow.follow_id, "new_rows": count, "kept_rows": len(follow.rows), "more": next_cursor is not None}
+        elif next_cursor:
+            notes["next_cursor"] = next_cursor
+        text = with_notes(text, response_format, notes)
+        stats = server_metrics.tool(tool_name)
+        stats.rows += count
+        stats.format_seconds += time.perf_counter() - started
+        return text
+
+    try:
+        return await _cached(
+            tool_name,
+            region_name,
+            query,
+            parameters,
+            produce,
+            {"compact": compact, "output_format": output_format},
+            cache=follow is None,
+            output_format=response_format,
+        )
+    except Exception as e:
+        return f"Error executing query: {str(e)}"
+
+
+# Labels of projected columns in text output
+COLUMN_LABELS = {
+    "TIMESTAMP": "Timestamp",
+    "message": "Message",
+    "error_message": "ErrorMessage",
+}
+
+# Annotation, default and description of every argument a generated tool can take
+TOOL_ARGUMENTS: Dict[str, Tuple[type, Any, str]] = {
+    "region_name": (str, inspect.Parameter.empty, "Name of the region where server is deployed"),
+    "server_name": (str, inspect.Parameter.empty, "Name of the server"),
+    "request_id": (str, inspect.Parameter.empty, "Request ID of the operation"),
+    "actor_name": (str, inspect.Parameter.empty, "Name of the actor"),
+    "reconciller_name": (str, inspect.Parameter.empty, "Name of the reconciller"),
+    "start_time": (str, inspect.Parameter.empty, "Start time of the query"),
+    "end_time": (str, inspect.Parameter.empty, "End time of the query"),
+    "search_key": (str, None, "Optional search key to filter logs. A single word matches whole words, word* matches words starting with it, alternatives are separated by |"),
+    "compact": (bool, False, "Group repetitive lines by template and return each template once with its count, first and last timestamps and an example"),
+    "output_format": (str, "text", "\"text\" for one line per row, or \"tsv\", \"csv\" or \"json\" for a table that names the columns once"),
+    "page_size": (int, DEFAULT_PAGE_SIZE, "Maximum number of rows to return, oldest first"),
+    "cursor": (str, None, "Continuation cursor returned by a previous call, to fetch the next page, or with follow=true the follow id returned by the previous follow call"),
+    "follow": (bool, False, "Return only rows newer than those returned by the previous follow call, for watching a live incident. The first call starts a stream and returns its follow id, pass it as cursor to later calls. start_time only applies to the first call and end_time is ignored"),
+}
+
+# Query texts kept across all generated tools, one per tool and search_key shape
+QUERY_VARIANTS = 256
 
-    with KustoClient(kcsb) as client:
-        crp = ClientRequestProperties()
-        crp.client_request_id = "kusto-mcp-server" + str(uuid.uuid4())
-        crp.set_parameter("start_time", start_time)
-        crp.set_parameter("end_time", end_time)
-        crp.set_parameter("search_key", search_key)
 
-        query = """
-        declare query_parameters(start_time: string, end_time: string, search_key: string);
+@dataclass(frozen=True)
+class LogToolSpec:
+    """Declarative description of a tool that pages through one log table.
+
+    The tool keeps the rows of table within the time window where key_column
+    equals the key_parameter argument and actor_column contains the
+    actor_parameter argument (each when set), plus any extra filters, applies
+    search_key and returns projection. A spec with a summary_name also gets a
+    summary tool over the same rows, grouped by summary_group_column.
+
+    Query text only depends on the spec and on the shape of search_key, so it
+    is built once per shape and reused; values are passed as query parameters.
+    """
+    name: str
+    description: str
+    table: str
+    projection: Tuple[str, ...] = ("TIMESTAMP", "message")
+    key_column: Optional[str] = None
+    key_parameter: Optional[str] = None
+    actor_column: Optional[str] = None
+    actor_parameter: Optional[str] = None
+    filters: Tuple[str, ...] = ()
+    default_page_size: int = DEFAULT_PAGE_SIZE
+    summary_name: Optional[str] = None
+    summary_description: str = ""
+    summary_group_column: Optional[str] = None
+
+    def format_row(self, row: Dict[str, Any]) -> str:
+        return ", ".join(f"{COLUMN_LABELS.get(column, column)}: {row[column]}" for column in self.projection)
+
+    def key_parameters(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Query parameters for the key and actor arguments of a call."""
+        parameters = {}
+        if self.key_parameter:
+            parameters[f"target_{self.key_parameter}"] = arguments[self.key_parameter]
+        if self.actor_parameter and self.actor_parameter in arguments:
+            parameters[self.actor_parameter] = arguments[self.actor_parameter]
+        return parameters
+
+    def _filtered(self, search: Tuple[str, str], actor: bool = True) -> Tuple[str, str]:
+        """The query_parameters declarations and where clauses shared by the page and summary queries."""
+        search_declarations, search_clause = search
+        declarations = ""
+        filters = ["| where TIMESTAMP between(start .. end)"]
+        if self.key_column:
+            declarations += f"target_{self.key_parameter}:string, "
+            filters.append(f"| where {self.key_column} == target_{self.key_parameter}")
+        if self.actor_column and actor:
+            declarations += f"{self.actor_parameter}:string, "
+            filters.append(f"| where {self.actor_column} contains {self.actor_parameter}")
+        filters.extend(f"| where {condition}" for condition in self.filters)
+        if search_clause:
+            filters.append(search_clause)
+        return f"{declarations}start_time: string, end_time: string, {search_declarations}", "\n        ".join(filters)
+
+    @functools.lru_cache(maxsize=QUERY_VARIANTS)
+    def page_query(self, search: Tuple[str, str]) -> str:
+        declarations, filters = self._filtered(search)
+        return f"""
+        declare query_parameters({declarations}cursor_time: string, cursor_tiebreak: long, page_limit: long);
         let start = todatetime(start_time);
         let end = todatetime(end_time);
-        MonMySQLDirector
-        | project TIMESTAMP, SourceContext, message
-        | where TIMESTAMP between(start .. end)
-        | where message contains search_key
-        | limit 500
+        {self.table}
+        {filters}
+        | project {', '.join(self.projection)}
+        {PAGE_CLAUSE}
         """
-        
-        try:
-            response = client.execute_query(DATABASE_NAME, query, crp)
-            for row in response.primary_results[0]:
-                result.append(f"Timestamp: {row['TIMESTAMP']}, SourceContext: {row['SourceContext']}, Message: {row['message']}")
-        except Exception as e:
-            return f"Error executing query: {str(e)}"
 
-        return "\n---\n".join(result)
+    @functools.lru_cache(maxsize=QUERY_VARIANTS)
+    def summary_query(self, search: Tuple[str, str]) -> str:
+        declarations, filters = self._filtered(search, actor=False)
+        return summary_query(self.table, declarations, filters, self.summary_group_column)
 
-@mcp.tool()
-def get_director_logs_for_actor(region_name: str, reconciller_name:str, start_time: str, end_time: str, search_key: str = None) -> str:
-    """Get messages for the director container or kubernetes(k8s) logs of mysql server for a particular reconciller between the given time range.
-    
-    Args:
-        region_name: Name of the region where server is deployed
-        reconciller_name: Name of the reconciller
-        start_time: Start time of the query
-        end_time: End time of the query
-        search_key: Optional search key to filter logs
-    """
-    cluster_uri = region_uris.get(region_name)
-    if not cluster_uri:
-        return f"Region {region_name} is not supported"
-    
-    kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_uri)
+    def signature(self, summary: bool = False) -> inspect.Signature:
+        names = ["region_name"]
+        if self.key_parameter:
+            names.append(self.key_parameter)
+        if self.actor_parameter and not summary:
+            names.append(self.actor_parameter)
+        names += ["start_time", "end_time", "search_key"]
+        if not summary:
+            names += ["compact", "output_format", "page_size", "cursor", "follow"]
 
-    result = []
+        parameters = []
+        for name in names:
+            annotation, default, _ = TOOL_ARGUMENTS[name]
+            if name == "page_size":
+                default = self.default_page_size
+            parameters.append(inspect.Parameter(name, inspect.Parameter.POSITIONAL_OR_KEYWORD, default=default, annotation=annotation))
+        return inspect.Signature(parameters, return_annotation=str)
+
+    def docstring(self, summary: bool = False) -> str:
+        if summary:
+            lines = [self.summary_description, "Use it to find the interesting interval before fetching raw logs with a narrow time range."]
+        else:
+            lines = [self.description]
+        lines += ["", "Args:"]
+        for name in self.signature(summary).parameters:
+            description = TOOL_ARGUMENTS[name][2]
+            if name == "region_name" and self.key_parameter == "server_name":
+                description += ', or "auto" to look it up'
+            lines.append(f"    {name}: {description}")
+        return "\n".join(lines)
+
+
+async def _run_log_tool(
+    spec: LogToolSpec,
+    region_name: str,
+    start_time: str,
+    end_time: str,
+    search_key: Optional[str] = None,
+    compact: bool = False,
+    output_format: str = "text",
+    page_size: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    follow: bool = False,
+    **arguments: Any,
+) -> str:
+    search = search_filter(search_key)
+    query = spec.page_query((search.declarations, search.clause))
+    parameters = {
+        **spec.key_parameters(arguments),
+        "start_time": start_time,
+        "end_time": end_time,
+        **search.parameters,
+    }
+    if not follow:
+        return await _run_query(spec.name, region_name, query, parameters, spec.format_row, page_size, cursor, compact=compact, output_format=output_format)
+
+    try:
+        stream = follows.resume(cursor, spec.name, region_name, parameters) if cursor else follows.start(spec.name, region_name, parameters)
+    except ValueError as e:
+        return str(e)
+    # A follow poll reads from where the stream started, whatever start_time later calls pass, up to a little
+    # before now, so rows that are still being ingested are not skipped
+    parameters["start_time"] = stream.start_time
+    parameters["end_time"] = (datetime.now(timezone.utc) - timedelta(seconds=FOLLOW_LAG_SECONDS)).isoformat()
+    async with stream.lock:
+        return await _run_query(spec.name, region_name, query, parameters, spec.format_row, page_size, compact=compact, output_format=output_format, follow=stream)
+
+
+async def _run_log_summary(spec: LogToolSpec, region_name: str, start_time: str, end_time: str, search_key: Optional[str] = None, **arguments: Any) -> str:
+    search = search_filter(search_key)
+    return await _run_summary(
+        spec.summary_name,
+        region_name,
+        spec.summary_query((search.declarations, search.clause)),
+        {
+            **spec.key_parameters(arguments),
+            "start_time": start_time,
+            "end_time": end_time,
+            **search.parameters,
+        },
+        spec.summary_group_column,
+    )
 
-    with KustoClient(kcsb) as client:
-        crp = ClientRequestProperties()
-        crp.client_request_id = "kusto-mcp-server" + str(uuid.uuid4())
-        crp.set_parameter("reconciller_name", reconciller_name)
-        crp.set_parameter("start_time", start_time)
-        crp.set_parameter("end_time", end_time)
-        crp.set_parameter("search_key", search_key)
 
-        query = """
-        declare query_parameters(reconciller_name:string, start_time: string, end_time: string, search_key: string);
+def _generated_tool(name: str, signature: inspect.Signature, docstring: str, run: Callable[..., Awaitable[str]]) -> Callable[..., Awaitable[str]]:
+    """Wrap run as a coroutine function with the given name, signature and docstring, which is what FastMCP reads."""
+    async def tool(*args: Any, **kwargs: Any) -> str:
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        return await run(**arguments.arguments)
+
+    tool.__name__ = tool.__qualname__ = name
+    tool.__doc__ = docstring
+    tool.__signature__ = signature
+    return tool
+
+
+LOG_TOOL_SPECS = [
+    LogToolSpec(
+        name="get_engine_logs",
+        description="Get mysql server engine logs between start_time and end_time.",
+        table="MonMySQLLogs",
+        key_column="LogicalServerName",
+        key_parameter="server_name",
+        summary_name="get_engine_logs_summary",
+        summary_description="Get a compact summary of mysql server engine logs between start_time and end_time:\n"
+        "a histogram of log lines over time and the most frequent message templates.",
+    ),
+    LogToolSpec(
+        name="get_launcher_logs",
+        description="Get messages for the launcher container of mysql server for the given time range.",
+        table="MonMySQLLauncher",
+        key_column="LogicalServerName",
+        key_parameter="server_name",
+        summary_name="get_launcher_logs_summary",
+        summary_description="Get a compact summary of the launcher container logs of mysql server for the given time range:\n"
+        "a histogram of log lines over time and the most frequent message templates.",
+    ),
+    LogToolSpec(
+        name="get_sidecar_logs",
+        description="Get messages for the sidecar container of mysql server for the given time range.",
+        table="MonMySQLSideCar",
+        key_column="LogicalServerName",
+        key_parameter="server_name",
+        summary_name="get_sidecar_logs_summary",
+        summary_description="Get a compact summary of the sidecar container logs of mysql server for the given time range:\n"
+        "a histogram of log lines over time per actor (SourceContext) and the most frequent message templates.",
+        summary_group_column="SourceContext",
+    ),
+    LogToolSpec(
+        name="get_sidecar_logs_for_actor",
+        description="Get messages for the sidecar container of mysql server for a particular actor between the given time range.",
+        table="MonMySQLSideCar",
+        key_column="LogicalServerName",
+        key_parameter="server_name",
+        actor_column="SourceContext",
+        actor_parameter="actor_name",
+    ),
+    LogToolSpec(
+        name="get_director_logs",
+        description="Get messages for the director container or kubernetes(k8s) logs of mysql server between the given time range.",
+        table="MonMySQLDirector",
+        projection=("TIMESTAMP", "SourceContext", "message"),
+        summary_name="get_director_logs_summary",
+        summary_description="Get a compact summary of the director container or kubernetes(k8s) logs for the given time range:\n"
+        "a histogram of log lines over time per reconciller (SourceContext) and the most frequent message templates.",
+        summary_group_column="SourceContext",
+    ),
+    LogToolSpec(
+        name="get_director_logs_for_actor",
+        description="Get messages for the director container or kubernetes(k8s) logs of mysql server for a particular reconciller between the given time range.",
+        table="MonMySQLDirector",
+        actor_column="SourceContext",
+        actor_parameter="reconciller_name",
+    ),
+    LogToolSpec(
+        name="get_rp_events_from_request_id",
+        description="Get resource provider (RP) messages for a particular request id between the given time range.",
+        table="MonOrcasBreadthRp",
+        projection=("TIMESTAMP", "message", "error_message"),
+        key_column="request_id",
+        key_parameter="request_id",
+        filters=("isnotempty(message) or isnotempty(error_message)",),
+    ),
+]
+
+for spec in LOG_TOOL_SPECS:
+    # Build the query text without a search_key up front, it is by far the most common
+    spec.page_query(("", ""))
+    mcp.add_tool(_generated_tool(spec.name, spec.signature(), spec.docstring(), functools.partial(_run_log_tool, spec)), name=spec.name)
+    if spec.summary_name:
+        spec.summary_query(("", ""))
+        mcp.add_tool(
+            _generated_tool(spec.summary_name, spec.signature(summary=True), spec.docstring(summary=True), functools.partial(_run_log_summary, spec)),
+            name=spec.summary_name,
+        )
+
+RP_EVENTS_QUERY = f"""
+        declare query_parameters(target_server_name:string, start_time: string, end_time: string, cursor_time: string, cursor_tiebreak: long, page_limit: long);
         let start = todatetime(start_time);
         let end = todatetime(end_time);
-        MonMySQLDirector
-        | where SourceContext contains reconciller_name
+        MonOrcasBreadthRp
         | where TIMESTAMP between(start .. end)
-        | where message contains search_key
-        | project TIMESTAMP, message
+        | where operation_parameters has target_server_name
+        | project TIMESTAMP, event, operation_type, request_id
+        {PAGE_CLAUSE}
+        """
+
+# Error rows of an operation do not repeat its operation_parameters, so they
+# are found through the request ids of the server's operations. The errors
+# are collected over the whole window, so this query must not be sharded:
+# an operation's event and error rows may fall in different shards.
+RP_EVENTS_WITH_ERRORS_QUERY = f"""
+        declare query_parameters(target_server_name:string, start_time: string, end_time: string, cursor_time: string, cursor_tiebreak: long, page_limit: long);
+        let start = todatetime(start_time);
+        let end = todatetime(end_time);
+        let operations = materialize(MonOrcasBreadthRp
+            | where TIMESTAMP between(start .. end)
+            | where operation_parameters has target_server_name
+            | project TIMESTAMP, event, operation_type, request_id);
+        let errors = MonOrcasBreadthRp
+            | where TIMESTAMP between(start .. end)
+            | where request_id in ((operations | distinct request_id))
+            | where isnotempty(error_message)
+            | summarize error_messages = make_set(error_message, {MAX_ERRORS_PER_REQUEST}) by request_id;
+        operations
+        | join kind=leftouter errors on request_id
+        | project TIMESTAMP, event, operation_type, request_id, error_messages
+        {PAGE_CLAUSE}
+        """
+
+# The query texts of the request ids and timeline tools only depend on the
+# shape of search_key, so like LogToolSpec.page_query they are built once per shape
+@functools.lru_cache(maxsize=QUERY_VARIANTS)
+def rp_events_from_request_ids_query(search: Tuple[str, str]) -> str:
+    declarations, clause = search
+    return f"""
+        declare query_parameters(target_request_ids:string, start_time: string, end_time: string, {declarations}cursor_time: string, cursor_tiebreak: long, page_limit: long);
+        let start = todatetime(start_time);
+        let end = todatetime(end_time);
+        let request_ids = parse_json(target_request_ids);
+        MonOrcasBreadthRp
+        | where TIMESTAMP between(start .. end)
+        | where request_id in (request_ids)
+        | where isnotempty(message) or isnotempty(error_message)
+        {clause}
+        | summarize messages = make_list(pack_array(TIMESTAMP, message, error_message), {MAX_MESSAGES_PER_REQUEST}), TIMESTAMP = min(TIMESTAMP) by request_id
+        | project TIMESTAMP, request_id, messages
+        {PAGE_CLAUSE}
+        """
+
+
+@functools.lru_cache(maxsize=QUERY_VARIANTS)
+def server_timeline_query(search: Tuple[str, str]) -> str:
+    declarations, clause = search
+    return f"""
+        declare query_parameters(target_server_name:string, start_time: string, end_time: string, {declarations}cursor_time: string, cursor_tiebreak: long, page_limit: long);
+        let start = todatetime(start_time);
+        let end = todatetime(end_time);
+        union
+            (MonMySQLLogs
+            | where TIMESTAMP between(start .. end)
+            | where LogicalServerName == target_server_name
+            | project TIMESTAMP, Source = "engine", message),
+            (MonMySQLLauncher
+            | where TIMESTAMP between(start .. end)
+            | where LogicalServerName == target_server_name
+            | project TIMESTAMP, Source = "launcher", message),
+            (MonMySQLSideCar
+            | where TIMESTAMP between(start .. end)
+            | where LogicalServerName == target_server_name
+            | project TIMESTAMP, Source = "sidecar", message),
+            (MonMySQLDirector
+            | where TIMESTAMP between(start .. end)
+            | where message has target_server_name
+            | project TIMESTAMP, Source = "director", message)
+        {clause}
+        {PAGE_CLAUSE}
         """
-        
-        try:
-            response = client.execute_query(DATABASE_NAME, query, crp)
-            for row in response.primary_results[0]:
-                result.append(f"Timestamp: {row['TIMESTAMP']}, Message: {row['message']}")
-        except Exception as e:
-            return f"Error executing query: {str(e)}"
 
-        return "\n---\n".join(result)
-    
+
 @mcp.tool()
-def get_rp_events(region_name: str, server_name: str, start_time: str, end_time: str) -> str:
+async def get_rp_events(region_name: str, server_name: str, start_time: str, end_time: str, include_errors: bool = False, output_format: str = "text", page_size: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> str:
     """
     Get resource provider (RP) messages which contains information about all operations on the server between the given time range.
     It also contains information about event types for each operation
     Each operation has a unique request_id which can be used to get more information about the operation.
 
     Args:
-        region_name: Name of the region where server is deployed
+        region_name: Name of the region where server is deployed, or "auto" to look it up
         server_name: Name of the server
         start_time: Start time of the query
         end_time: End time of the query
+        include_errors: Also return the error messages of failed operations, saving a lookup per request_id
+        output_format: "text" for one line per row, or "tsv", "csv" or "json" for a table that names the columns once
+        page_size: Maximum number of rows to return, oldest first
+        cursor: Continuation cursor returned by a previous call, to fetch the next page
     """
-    cluster_uri = region_uris.get(region_name)
-    if not cluster_uri:
-        return f"Region {region_name} is not supported"
-    
-    kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_uri)
+    query = RP_EVENTS_WITH_ERRORS_QUERY if include_errors else RP_EVENTS_QUERY
 
-    result = []
-
-    with KustoClient(kcsb) as client:
-        crp = ClientRequestProperties()
-        crp.client_request_id = "kusto-mcp-server" + str(uuid.uuid4())
-        crp.set_parameter("target_server_name", server_name)
-        crp.set_parameter("start_time", start_time)
-        crp.set_parameter("end_time", end_time)
-
-        query = """
-        declare query_parameters(target_server_name:string, start_time: string, end_time: string);
-        let start = todatetime(start_time);
-        let end = todatetime(end_time);
-        MonOrcasBreadthRp
-        | where operation_parameters has target_server_name
-        | where TIMESTAMP between(start .. end)
-        | project TIMESTAMP, event, operation_type, request_id
-        """
-        
-        try:
-            response = client.execute_query(DATABASE_NAME, query, crp)
-            for row in response.primary_results[0]:
-                result.append(f"Timestamp: {row['TIMESTAMP']}, Event: {row['event']}, OperationType: {row['operation_type']}, Request ID: {row['request_id']}")
-        except Exception as e:
-            return f"Error executing query: {str(e)}"
+    def format_row(row):
+        line = f"Timestamp: {row['TIMESTAMP']}, Event: {row['event']}, OperationType: {row['operation_type']}, Request ID: {row['request_id']}"
+        if include_errors and row['error_messages']:
+            line += f", ErrorMessages: {'; '.join(row['error_messages'])}"
+        return line
 
-        return "\n---\n".join(result)
+    return await _run_query(
+        "get_rp_events",
+        region_name,
+        query,
+        {
+            "target_server_name": server_name,
+            "start_time": start_time,
+            "end_time": end_time,
+        },
+        format_row,
+        page_size,
+        cursor,
+        shardable=not include_errors,
+        output_format=output_format,
+    )
 
 @mcp.tool()
-def get_rp_events_from_request_id(region_name: str, request_id: str, start_time: str, end_time: str, search_key: str = None) -> str:
+async def get_rp_events_from_request_ids(region_name: str, request_ids: List[str], start_time: str, end_time: str, search_key: str = None, output_format: str = "text", page_size: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> str:
     """
-    Get resource provider (RP) messages for a particular request id between the given time range.
+    Get resource provider (RP) messages for several request ids at once between the given time range, grouped by request id.
+    Prefer this over calling get_rp_events_from_request_id once per request id.
 
     Args:
         region_name: Name of the region where server is deployed
-        request_id: Request ID of the operation
+        request_ids: Request IDs of the operations
         start_time: Start time of the query
         end_time: End time of the query
-        search_key: Search key to filter messages
+        search_key: Search key to filter messages. A single word matches whole words, word* matches words starting with it, alternatives are separated by |
+        output_format: "text" for one line per row, or "tsv", "csv" or "json" for a table that names the columns once
+        page_size: Maximum number of request ids to return, ordered by their first message
+        cursor: Continuation cursor returned by a previous call, to fetch the next page
     """
-    cluster_uri = region_uris.get(region_name)
-    if not cluster_uri:
-        return f"Region {region_name} is not supported"
-    
-    kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_uri)
+    search = search_filter(search_key)
+    query = rp_events_from_request_ids_query((search.declarations, search.clause))
 
-    result = []
+    def format_row(row):
+        # make_list does not keep the input order, so sort each request's messages here
+        messages = sorted(row['messages'], key=lambda message: message[0])
+        lines = [f"Request ID: {row['request_id']}"]
+        lines.extend(f"Timestamp: {timestamp}, Message: {message}, ErrorMessage: {error_message}" for timestamp, message, error_message in messages)
+        return "\n".join(lines)
 
-    with KustoClient(kcsb) as client:
-        crp = ClientRequestProperties()
-        crp.client_request_id = "kusto-mcp-server" + str(uuid.uuid4())
-        crp.set_parameter("target_request_id", request_id)
-        crp.set_parameter("start_time", start_time)
-        crp.set_parameter("end_time", end_time)
-        crp.set_parameter("search_key", search_key)
+    return await _run_query(
+        "get_rp_events_from_request_ids",
+        region_name,
+        query,
+        {
+            "target_request_ids": json.dumps(sorted(set(request_ids))),
+            "start_time": start_time,
+            "end_time": end_time,
+            **search.parameters,
+        },
+        format_row,
+        page_size,
+        cursor,
+        shardable=False,
+        output_format=output_format,
+    )
 
-        query = """
-        declare query_parameters(target_request_id:string, start_time: string, end_time: string, search_key: string);
-        let start = todatetime(start_time);
-        let end = todatetime(end_time);
-        MonOrcasBreadthRp
-        | where request_id == target_request_id
-        | where TIMESTAMP between(start .. end)
-        | where isnotempty(message) or isnotempty(error_message)
-        | where message contains search_key
-        | project TIMESTAMP, message, error_message
-        """
-        
-        try:
-            response = client.execute_query(DATABASE_NAME, query, crp)
-            for row in response.primary_results[0]:
-                result.append(f"Timestamp: {row['TIMESTAMP']}, Message: {row['message']}, ErrorMessage: {row['error_message']}")
-        except Exception as e:
-            return f"Error executing query: {str(e)}"
+@mcp.tool()
+async def get_server_timeline(region_name: str, server_name: str, start_time: str, end_time: str, search_key: str = None, compact: bool = False, output_format: str = "text", page_size: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> str:
+    """Get one timeline of engine, launcher, sidecar and director messages of mysql server between the given time range.
+    Each message is tagged with its source. Director messages are included when they mention the server name.
+    Prefer this over calling the per-container log tools one after another.
+
+    Args:
+        region_name: Name of the region where server is deployed, or "auto" to look it up
+        server_name: Name of the server
+        start_time: Start time of the query
+        end_time: End time of the query
+        search_key: Optional search key to filter logs. A single word matches whole words, word* matches words starting with it, alternatives are separated by |
+        compact: Group repetitive lines by template and return each template once with its count, first and last timestamps and an example
+        output_format: "text" for one line per row, or "tsv", "csv" or "json" for a table that names the columns once
+        page_size: Maximum number of rows to return across all sources, oldest first
+        cursor: Continuation cursor returned by a previous call, to fetch the next page
+    """
+    search = search_filter(search_key)
+    query = server_timeline_query((search.declarations, search.clause))
+
+    return await _run_query(
+        "get_server_timeline",
+        region_name,
+        query,
+        {
+            "target_server_name": server_name,
+            "start_time": start_time,
+            "end_time": end_time,
+            **search.parameters,
+        },
+        lambda row: f"Timestamp: {row['TIMESTAMP']}, Source: {row['Source']}, Message: {row['message']}",
+        page_size,
+        cursor,
+        compact=compact,
+        output_format=output_format,
+    )
+
+@mcp.tool()
+async def locate_server(server_name: str) -> str:
+    """Find the region where a mysql server is deployed by checking all regions at once.
+
+    Args:
+        server_name: Name of the server
+    """
+    region_name = await locate_region(server_name)
+    if not region_name:
+        return f"Server {server_name} was not found in any region"
+    return f"Server {server_name} is deployed in region {region_name}"
+
+@mcp.tool()
+async def get_server_stats(openmetrics: bool = False) -> str:
+    """Get latency and throughput stats of this server: per tool call latency, rows and bytes returned and cache hits,
+    and per region Kusto query latency and the resource usage Kusto reported.
+
+    Args:
+        openmetrics: Return the stats in the OpenMetrics text format instead of a readable summary
+    """
+    return server_metrics.render_openmetrics() if openmetrics else server_metrics.render_text()
+
+@mcp.resource("follow://{follow_id}", name="follow_rows", description="Latest rows returned by a log tool called with follow=true", mime_type="text/plain")
+def follow_rows(follow_id: str) -> str:
+    stream = follows.get(follow_id)
+    if stream is None:
+        raise ValueError(f"Unknown follow id {follow_id}")
+    return "\n".join(stream.rows)
+
+@mcp.resource("stats://server", name="server_stats", description="Server stats in the OpenMetrics text format", mime_type="application/openmetrics-text")
+def server_stats() -> str:
+    return server_metrics.render_openmetrics()
 
-        return "\n---\n".join(result)
-       
 if __name__ == "__main__":
-    # Run the FastMCP server using the stdio transport
-    mcp.run(transport="stdio")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Kusto MCP server")
+    parser.add_argument("--transport", choices=TRANSPORTS, default=TRANSPORT, help="stdio for one client, streamable-http or sse to serve many")
+    parser.add_argument("--host", default=HTTP_HOST, help="Address the HTTP transports listen on")
+    parser.add_argument("--port", type=int, default=HTTP_PORT, help="Port the HTTP transports listen on")
+    args = parser.parse_args()
+
+    TRANSPORT = args.transport
+    if TRANSPORT != "stdio" and args.host not in LOOPBACK_HOSTS:
+        logger.warning(
+            "Listening on %s without authentication: anyone who can reach port %d can query every cluster as the signed in Azure CLI user",
+            args.host,
+            args.port,
+        )
+        # FastMCP only accepts localhost Host headers when it is built for a
+        # loopback host; like FastMCP(host=...) with any other host, drop that check
+        mcp.settings.transport_security = None
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    mcp.run(transport=TRANSPORT)
\ No newline at end of file
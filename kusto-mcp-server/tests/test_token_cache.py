@@ -0,0 +1,72 @@
+from pathlib import Path
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import TokenCache
+
+AUDIENCE = "https://cluster.kusto.windows.net"
+
+
+class FakeTokenSource:
+    """Hands out numbered tokens valid for an hour, optionally holding each fetch until released."""
+
+    def __init__(self, clock, block: bool = False):
+        self.clock = clock
+        self.calls = 0
+        self.fetched = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def __call__(self, audience: str):
+        self.calls += 1
+        self.release.wait(5)
+        self.fetched.set()
+        return f"token-{self.calls}", self.clock() + 3600
+
+
+def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_miss_hit_and_background_refresh():
+    now = [1000.0]
+    source = FakeTokenSource(lambda: now[0])
+    cache = TokenCache(token_source=source, refresh_margin=300, clock=lambda: now[0])
+
+    assert cache.get_token(AUDIENCE) == "token-1"
+    assert cache.get_token(AUDIENCE) == "token-1"
+    assert (source.calls, cache.hits, cache.misses) == (1, 1, 1)
+
+    # Inside the refresh margin the cached token is still served while its replacement is fetched
+    now[0] += 3600 - 200
+    source.fetched.clear()
+    assert cache.get_token(AUDIENCE) == "token-1"
+    assert source.fetched.wait(5)
+    wait_until(lambda: cache.stats()["refreshes"] == 2)
+    assert cache.get_token(AUDIENCE) == "token-2"
+    assert source.calls == 2
+
+
+def test_concurrent_misses_share_one_fetch():
+    source = FakeTokenSource(time.time, block=True)
+    cache = TokenCache(token_source=source)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_token(AUDIENCE))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+
+    wait_until(lambda: cache.stats()["misses"] == len(threads))
+    # Let every thread reach the in-flight fetch before it completes
+    time.sleep(0.1)
+    source.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["token-1"] * len(threads)
+    assert source.calls == 1